@@ -0,0 +1,227 @@
+"""
+bench_fetch.py
+
+End-to-end benchmark of fetch_metrics.py against the local fake API in
+fake_github.py. No token or network access is needed.
+
+Each scenario starts a fresh fake server with a synthetic account,
+runs fetch_metrics.py in a temporary directory and reports wall-clock
+time together with the requests the server saw.
+
+Modes:
+- sequential:  one statistics request at a time, cold cache
+- concurrent:  STATS_WORKERS requests at a time, cold cache
+- cached:      concurrent, after a priming run, without the repository
+               state file, so unchanged statistics come back as 304
+- incremental: concurrent, after a priming run, with the repository
+               state file, so unchanged repositories are skipped
+
+Every mode must arrive at the same LOC totals, and no repository may
+time out while the fake server readies each one within --warmup polls;
+the benchmark exits non-zero otherwise, so it doubles as a regression
+check.
+
+Usage:
+    python scripts/bench_fetch.py
+    python scripts/bench_fetch.py --sizes 10,100 --modes sequential,concurrent
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_github import FakeGitHub
+from fetch_metrics import STATS_RETRIES
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FETCH_METRICS = os.path.join(SCRIPTS_DIR, "fetch_metrics.py")
+
+MODES = ["sequential", "concurrent", "cached", "incremental"]
+SIZES = [10, 100, 1000]
+
+TIMED_OUT = re.compile(
+    r"Contributor statistics: \d+ finished, (\d+) timed out"
+)
+
+
+def run_fetch(fake, workdir, workers, retry_delay):
+    """
+    Run fetch_metrics.py once; returns (seconds, server counters,
+    repositories reported as timed out).
+    """
+
+    env = dict(os.environ)
+    env.pop("GITHUB_GRAPHQL_URL", None)
+    env.update(
+        {
+            "GITHUB_TOKEN": "fake-token",
+            "GITHUB_API_URL": fake.url,
+            "STATS_WORKERS": str(workers),
+            "STATS_RETRY_DELAY": str(retry_delay),
+        }
+    )
+
+    before = fake.summary()
+    started = time.perf_counter()
+
+    result = subprocess.run(
+        [sys.executable, FETCH_METRICS],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    elapsed = time.perf_counter() - started
+
+    if result.returncode != 0:
+        sys.stderr.write(result.stdout[-2000:])
+        sys.stderr.write(result.stderr[-2000:])
+        raise RuntimeError("fetch_metrics.py failed")
+
+    after = fake.summary()
+    delta = {
+        key: after.get(key, 0) - before.get(key, 0)
+        for key in after
+        if key != "repos_polled"
+    }
+
+    match = TIMED_OUT.search(result.stdout)
+
+    return elapsed, delta, int(match.group(1)) if match else 0
+
+
+def run_scenario(size, mode, args):
+    fake = FakeGitHub(
+        repos=size,
+        seed=args.seed,
+        latency=args.latency,
+        warmup=args.warmup,
+        error_rate=args.error_rate,
+    )
+    fake.start()
+
+    workdir = tempfile.mkdtemp(prefix="bench-fetch-")
+    workers = 1 if mode == "sequential" else args.workers
+
+    try:
+        if mode in ("cached", "incremental"):
+            run_fetch(fake, workdir, workers, args.retry_delay)
+
+            if mode == "cached":
+                os.remove(os.path.join(workdir, ".cache", "repo_state.json"))
+
+        elapsed, counters, timed_out = run_fetch(
+            fake, workdir, workers, args.retry_delay
+        )
+
+        with open(os.path.join(workdir, "metrics.json"), encoding="utf-8") as f:
+            metrics = json.load(f)
+    finally:
+        fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Every non-final answer (202, 5xx, rate limit) is retried once.
+    errors = sum(
+        value for key, value in counters.items()
+        if key.startswith("status_5") or key in ("status_403", "status_429")
+    )
+
+    return {
+        "repos": size,
+        "mode": mode,
+        "seconds": round(elapsed, 3),
+        "requests": counters.get("requests", 0),
+        "stats_requests": counters.get("stats", 0),
+        "retries": counters.get("status_202", 0) + errors,
+        "status_202": counters.get("status_202", 0),
+        "status_304": counters.get("status_304", 0),
+        "errors": errors,
+        "timed_out": timed_out,
+        "loc_added": metrics["loc_added"],
+        "loc_removed": metrics["loc_removed"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fetch_metrics.py")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--retry-delay", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    modes = args.modes.split(",")
+
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode: {mode}")
+
+    header = (
+        f"{'repos':>6}  {'mode':<12} {'seconds':>8} {'requests':>9} "
+        f"{'stats':>6} {'retries':>8} {'202':>5} {'304':>5} {'errors':>7} "
+        f"{'timeout':>8}"
+    )
+
+    print(header)
+    print("-" * len(header))
+
+    results = []
+    failures = 0
+
+    for size in sizes:
+        for mode in modes:
+            row = run_scenario(size, mode, args)
+            results.append(row)
+
+            print(
+                f"{row['repos']:>6}  {row['mode']:<12} "
+                f"{row['seconds']:>8.2f} {row['requests']:>9} "
+                f"{row['stats_requests']:>6} {row['retries']:>8} "
+                f"{row['status_202']:>5} {row['status_304']:>5} "
+                f"{row['errors']:>7} {row['timed_out']:>8}"
+            )
+
+            # The fake server finishes every repository within warmup
+            # polls, so a timeout means a ready repository was dropped.
+            if row["timed_out"] and args.warmup < STATS_RETRIES:
+                print(
+                    f"ERROR: {row['timed_out']} repositories timed out in "
+                    f"{mode} mode although each is ready within "
+                    f"{args.warmup + 1} polls"
+                )
+                failures += 1
+
+        # Every mode must arrive at the same figures.
+        totals = {
+            (row["loc_added"], row["loc_removed"])
+            for row in results
+            if row["repos"] == size
+        }
+
+        if len(totals) > 1:
+            print(f"ERROR: modes disagree on LOC for {size} repos: {totals}")
+            failures += 1
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
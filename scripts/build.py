@@ -0,0 +1,251 @@
+"""
+build.py
+
+Runs the whole update in one process: metrics, then the cards.
+
+The steps form a small dependency graph:
+
+    metrics  (fetch_metrics.py)   -> metrics.json, metrics_weekly.bin
+    readme   (generate_readme.py) -> neofetch.svg       needs metrics
+    cube     (cube_scramble.py)   -> cube_scramble.svg
+    proc     (proc_modules.py)    -> proc_modules.svg
+
+Every step runs as soon as the steps it needs are done, on a thread
+pool, so cube and proc render while metrics is still waiting on the
+API. The interpreter and the shared modules (svgterm, manifest) are
+loaded once instead of once per script. A timing table follows the run.
+
+A step left out with --only or --skip counts as done: its outputs are
+used as they are on disk. If a step fails, the steps that need it are
+skipped and the build exits non-zero.
+
+With --watch the selected cards are re-rendered whenever their code or
+metrics.json changes, and served on a page that reloads itself (see
+preview.py). Metrics are not fetched in watch mode.
+
+Usage:
+    python scripts/build.py
+    python scripts/build.py --only cube,proc
+    python scripts/build.py --skip metrics
+    python scripts/build.py --watch [--port 8000]
+"""
+
+import argparse
+import importlib
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from preview import PREVIEW_PORT, watch
+
+
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", "4"))
+
+Node = namedtuple("Node", ["name", "module", "needs", "outputs"])
+
+NODES = (
+    Node(
+        "metrics", "fetch_metrics", (), ("metrics.json", "metrics_weekly.bin")
+    ),
+    Node("readme", "generate_readme", ("metrics",), ("neofetch.svg",)),
+    Node("cube", "cube_scramble", (), ("cube_scramble.svg",)),
+    Node("proc", "proc_modules", (), ("proc_modules.svg",)),
+)
+
+GRAPH = {node.name: node for node in NODES}
+
+
+class StepFailed(Exception):
+    """A step raised; seconds is how long it ran before failing."""
+
+    def __init__(self, message, seconds):
+        super().__init__(message)
+        self.seconds = seconds
+
+
+def run_node(node):
+    """
+    Run one step's main(); returns its duration in seconds. Raises
+    StepFailed, with the duration up to the failure, if it fails.
+    """
+
+    started = time.perf_counter()
+
+    try:
+        main = importlib.import_module(node.module).main
+
+        if node.module == "fetch_metrics":
+            # It parses its own arguments; the build's are not for it.
+            main([])
+        else:
+            main()
+    except SystemExit as exc:
+        if exc.code:
+            raise StepFailed(
+                f"{node.module} exited with {exc.code}",
+                time.perf_counter() - started,
+            ) from exc
+    except Exception as exc:
+        raise StepFailed(str(exc), time.perf_counter() - started) from exc
+
+    return time.perf_counter() - started
+
+
+def select(only, skip):
+    """Names of the nodes to run, in graph order."""
+
+    for name in only + skip:
+        if name not in GRAPH:
+            raise ValueError(
+                f"unknown step: {name} (steps: {', '.join(GRAPH)})"
+            )
+
+    return [
+        node.name for node in NODES
+        if (not only or node.name in only) and node.name not in skip
+    ]
+
+
+def build(selected, workers=BUILD_WORKERS):
+    """
+    Run the selected nodes in dependency order, in parallel where the
+    graph allows. Returns {name: (status, seconds)}.
+    """
+
+    results = {}
+    pending = list(selected)
+    running = {}
+
+    def ready(node):
+        return all(
+            need not in selected or results.get(need, ("",))[0] == "ok"
+            for need in node.needs
+        )
+
+    def blocked(node):
+        return any(
+            need in selected and results.get(need, ("ok",))[0] != "ok"
+            for need in node.needs
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name in list(pending):
+                node = GRAPH[name]
+
+                if blocked(node):
+                    pending.remove(name)
+                    results[name] = ("skipped", 0.0)
+                elif ready(node):
+                    pending.remove(name)
+                    running[pool.submit(run_node, node)] = name
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+
+                try:
+                    results[name] = ("ok", future.result())
+                except StepFailed as exc:
+                    print(f"{name} failed: {exc}", file=sys.stderr)
+                    results[name] = ("failed", exc.seconds)
+
+    return results
+
+
+def print_timings(results, elapsed):
+    header = f"{'step':<10} {'status':<8} {'seconds':>8}  outputs"
+
+    print()
+    print(header)
+    print("-" * len(header))
+
+    for node in NODES:
+        if node.name not in results:
+            continue
+
+        status, seconds = results[node.name]
+
+        print(
+            f"{node.name:<10} {status:<8} {seconds:>8.2f}  "
+            f"{', '.join(node.outputs)}"
+        )
+
+    busy = sum(seconds for _, seconds in results.values())
+
+    print("-" * len(header))
+    print(f"{'wall':<10} {'':<8} {elapsed:>8.2f}  (steps sum {busy:.2f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fetch metrics and render every card in one process"
+    )
+    parser.add_argument(
+        "--only",
+        metavar="STEPS",
+        default="",
+        help=f"run only these steps (comma-separated: {', '.join(GRAPH)})",
+    )
+    parser.add_argument(
+        "--skip",
+        metavar="STEPS",
+        default="",
+        help="run every step except these",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=BUILD_WORKERS,
+        help="steps run at the same time",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="re-render the cards on every change and serve a live preview",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=PREVIEW_PORT,
+        help="port of the --watch preview server",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        selected = select(
+            [name for name in args.only.split(",") if name],
+            [name for name in args.skip.split(",") if name],
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    if args.watch:
+        # Steps that fetch data are not re-run; their outputs on disk
+        # are watched instead.
+        rendered = [GRAPH[name] for name in selected if name != "metrics"]
+        data = [
+            (node.name, output)
+            for node in NODES
+            if node not in rendered
+            for output in node.outputs
+        ]
+
+        watch(rendered, run_node, data, args.port)
+        return 0
+
+    started = time.perf_counter()
+    results = build(selected, args.workers)
+    print_timings(results, time.perf_counter() - started)
+
+    return 0 if all(status == "ok" for status, _ in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+cassette.py
+
+Record and replay of HTTP exchanges, for offline and repeatable runs.
+
+A cassette holds every response a run received: status, reason,
+headers, body and how long the exchange took. RecordingAdapter wraps
+the real transport and adds each exchange to a cassette;
+ReplayAdapter answers from a cassette in-process, without a network or
+a token:
+
+    cassette = Cassette()
+    session.mount("https://", RecordingAdapter(adapter, cassette))
+    ...
+    cassette.save("run.cassette")
+
+    session.mount("https://", ReplayAdapter(Cassette.load("run.cassette")))
+
+Requests are matched by method, URL path and query, and body; the host
+is ignored, so a cassette recorded against api.github.com also answers
+a run pointed at another GITHUB_API_URL. Timestamps in the body
+(e.g. GraphQL since/until variables derived from the current time) are
+left out of the match, so a replay on a later day still finds them.
+Repeated requests are answered in recorded order, so a repository's
+202 polls replay as they happened; once the recorded answers run out,
+the last one is repeated.
+
+Replay returns immediately by default. With latency=True every
+response is delayed by the time it originally took, which keeps
+concurrency effects visible when comparing two versions of the code.
+
+File format: gzip-compressed JSON lines, one header line followed by
+one line per exchange. Request headers are not stored, so the
+Authorization token never ends up in a cassette.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+import tracing
+from http_cache import TRANSFER_HEADERS
+
+
+VERSION = 1
+
+# ISO 8601 timestamps, as sent in GraphQL variables.
+_TIMESTAMP = re.compile(rb"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?Z")
+
+
+def request_key(request):
+    """Match key of a prepared request: method, path and query, body."""
+
+    body = request.body or b""
+
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+
+    digest = hashlib.sha256()
+    digest.update(request.method.encode("ascii"))
+    digest.update(b" ")
+    digest.update(request.path_url.encode("utf-8"))
+    digest.update(b"\n")
+    digest.update(_TIMESTAMP.sub(b"<timestamp>", body))
+
+    return digest.hexdigest()
+
+
+class CassetteMiss(ConnectionError):
+    """A replayed run sent a request the cassette has no answer for."""
+
+
+class Cassette:
+    """Recorded exchanges, grouped by request key in recorded order."""
+
+    def __init__(self, recorded_at=None):
+        self.recorded_at = recorded_at
+
+        # key -> [exchange, ...]
+        self.exchanges = {}
+
+        # key -> answers handed out so far, while replaying
+        self._served = {}
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(exchanges) for exchanges in self.exchanges.values())
+
+    def add(self, request, response, body, latency):
+        exchange = {
+            "key": request_key(request),
+            "method": request.method,
+            "url": request.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                name: value
+                for name, value in response.headers.items()
+                if name.lower() not in TRANSFER_HEADERS
+            },
+            "latency": round(latency, 4),
+        }
+
+        try:
+            exchange["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            exchange["body_base64"] = base64.b64encode(body).decode("ascii")
+
+        with self._lock:
+            self.exchanges.setdefault(exchange["key"], []).append(exchange)
+
+    def next(self, request):
+        """Return the next recorded exchange for request, or None."""
+
+        key = request_key(request)
+
+        with self._lock:
+            exchanges = self.exchanges.get(key)
+
+            if not exchanges:
+                return None
+
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+
+        return exchanges[min(served, len(exchanges) - 1)]
+
+    # Storage
+
+    def save(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._lock:
+            exchanges = [
+                exchange
+                for key in self.exchanges
+                for exchange in self.exchanges[key]
+            ]
+
+        header = {
+            "version": VERSION,
+            "recorded_at": self.recorded_at or datetime.now(
+                timezone.utc
+            ).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "exchanges": len(exchanges),
+        }
+
+        temporary = f"{path}.tmp"
+
+        with gzip.open(temporary, "wt", encoding="utf-8") as f:
+            for line in [header] + exchanges:
+                f.write(json.dumps(line, separators=(",", ":")))
+                f.write("\n")
+
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved cassette; raises OSError or ValueError."""
+
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+        except (EOFError, gzip.BadGzipFile) as exc:
+            raise ValueError(f"{path} is not a cassette: {exc}") from exc
+
+        if not lines or lines[0].get("version") != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} cassette")
+
+        cassette = cls(lines[0].get("recorded_at"))
+
+        for exchange in lines[1:]:
+            cassette.exchanges.setdefault(exchange["key"], []).append(
+                exchange
+            )
+
+        return cassette
+
+
+class RecordingAdapter(BaseAdapter):
+    """Transport adapter that adds every exchange to a Cassette."""
+
+    def __init__(self, adapter, cassette):
+        super().__init__()
+
+        self.adapter = adapter
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+
+        response = self.adapter.send(request, **kwargs)
+
+        # The whole body is read here so it can be stored; requests
+        # serves iter_content from the read body afterwards.
+        body = response.content
+
+        self.cassette.add(
+            request, response, body, time.perf_counter() - started
+        )
+
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers from a Cassette."""
+
+    def __init__(self, cassette, latency=False):
+        super().__init__()
+
+        self.cassette = cassette
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        exchange = self.cassette.next(request)
+
+        if exchange is None:
+            raise CassetteMiss(
+                f"no recorded response for {request.method} {request.url}",
+                request=request,
+            )
+
+        if self.latency:
+            tracing.sleep(exchange["latency"], "replay latency")
+
+        if "body_base64" in exchange:
+            body = base64.b64decode(exchange["body_base64"])
+        else:
+            body = exchange["body"].encode("utf-8")
+
+        headers = CaseInsensitiveDict(exchange["headers"])
+
+        response = Response()
+        response.status_code = exchange["status"]
+        response.reason = exchange["reason"]
+        response.headers = headers
+        response._content = body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.encoding = get_encoding_from_headers(headers)
+
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,239 @@
+"""
+contributor_stats.py
+
+Streaming reader for GitHub's /repos/{owner}/{repo}/stats/contributors.
+
+The endpoint returns every contributor with their full weekly history:
+
+    [
+      {
+        "total": 135,
+        "weeks": [{"w": 1367712000, "a": 6898, "d": 77, "c": 10}, ...],
+        "author": {"login": "octocat", ...}
+      },
+      ...
+    ]
+
+Only one contributor is wanted, so instead of building the whole list
+with json.loads, ContributorStatsParser is fed the body chunk by chunk.
+The weeks of each contributor are read into compact arrays as they
+stream past and dropped again unless the contributor's author.login
+turns out to match. Memory use is bounded by the chunk size plus one
+contributor's weekly history, however many contributors the repository
+has.
+
+    parser = ContributorStatsParser("octocat")
+
+    for chunk in response.iter_content(65536):
+        parser.feed(chunk)
+
+    parser.close()
+    parser.result  # (additions, deletions, commits) or None
+    parser.weeks   # (week, additions, deletions, commits) arrays or None
+"""
+
+import json
+import re
+from array import array
+
+
+# One JSON token, preceded by optional whitespace.
+_TOKEN = re.compile(
+    rb'\s*(?:"((?:[^"\\]|\\.)*)"'
+    rb"|(-?[0-9][0-9.eE+-]*)"
+    rb"|(true|false|null)"
+    rb"|([\[\]{}:,]))"
+)
+
+# One week object inside a "weeks" array, and its numeric fields.
+_WEEK = re.compile(rb"\{([^}]*)\}")
+
+# The same with the fields in GitHub's order, which is matched first as
+# it needs no per-week work in Python.
+_ORDERED_WEEK = re.compile(
+    rb'\{\s*"w"\s*:\s*(-?[0-9]+)\s*,\s*"a"\s*:\s*(-?[0-9]+)\s*,'
+    rb'\s*"d"\s*:\s*(-?[0-9]+)\s*,\s*"c"\s*:\s*(-?[0-9]+)\s*\}'
+)
+_WEEK_FIELD = re.compile(rb'"([wadc])"\s*:\s*(-?[0-9]+)')
+
+# Week timestamp, additions, deletions and commits, in result order.
+_COLUMNS = (b"w", b"a", b"d", b"c")
+
+
+class ContributorStatsParser:
+    """Incrementally finds one login's totals in a contributors body."""
+
+    def __init__(self, login):
+        self.login = login.lower()
+
+        # (additions, deletions, commits) of the matching contributor,
+        # and their (week, additions, deletions, commits) columns.
+        self.result = None
+        self.weeks = None
+
+        self._buffer = b""
+
+        # Open containers ("[" or "{") and the current key of each.
+        self._stack = []
+        self._keys = []
+        self._expect_key = False
+
+        # Login and weekly columns of the contributor being read.
+        self._contributor = None
+        self._in_weeks = False
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        self._parse(final=False)
+
+    def close(self):
+        """Finish parsing; raises ValueError if the body was incomplete."""
+
+        self._parse(final=True)
+
+        if self._stack or self._in_weeks or self._buffer.strip():
+            raise ValueError("truncated contributor statistics")
+
+    # Parsing
+
+    def _parse(self, final):
+        buffer = self._buffer
+        pos = 0
+
+        while True:
+            if self._in_weeks:
+                pos, done = self._read_weeks(buffer, pos)
+
+                if not done:
+                    break
+
+                continue
+
+            match = _TOKEN.match(buffer, pos)
+
+            if match is None:
+                break
+
+            # A number at the end of the buffer may continue in the next
+            # chunk.
+            if match.group(2) and match.end() == len(buffer) and not final:
+                break
+
+            pos = match.end()
+            string, number, _, punct = match.groups()
+
+            if punct:
+                self._punctuation(punct)
+            elif string is not None and self._expect_key:
+                self._keys[-1] = string
+                self._expect_key = False
+            elif string is not None:
+                self._string(string)
+            elif number:
+                self._number(number)
+
+        self._buffer = buffer[pos:]
+
+    def _read_weeks(self, buffer, pos):
+        """
+        Sum the week objects in buffer[pos:] up to the closing bracket.
+
+        Week objects only hold numbers, so the array ends at the next "]".
+        Only whole week objects are summed; a partial one is left in the
+        buffer. Returns (new pos, whether the array ended).
+        """
+
+        end = buffer.find(b"]", pos)
+
+        if end == -1:
+            stop = max(pos, buffer.rfind(b"}", pos) + 1)
+        else:
+            stop = end
+
+        contributor = self._contributor
+
+        # Weeks of a contributor already known not to match are skipped.
+        if contributor["login"] in (None, self.login):
+            weeks = _ORDERED_WEEK.findall(buffer, pos, stop)
+
+            if len(weeks) != buffer.count(b"{", pos, stop):
+                weeks = [
+                    tuple(
+                        fields.get(field, 0)
+                        for fields in [dict(_WEEK_FIELD.findall(week))]
+                        for field in _COLUMNS
+                    )
+                    for week in _WEEK.findall(buffer, pos, stop)
+                ]
+
+            for field, values in zip(_COLUMNS, zip(*weeks)):
+                contributor[field].extend(map(int, values))
+
+        if end == -1:
+            return stop, False
+
+        self._in_weeks = False
+        return end + 1, True
+
+    def _punctuation(self, punct):
+        stack = self._stack
+
+        if punct in b"{[":
+            if (
+                punct == b"["
+                and len(stack) == 2
+                and self._keys[-1] == b"weeks"
+            ):
+                self._in_weeks = True
+                return
+
+            if punct == b"{" and len(stack) == 1:
+                self._contributor = {
+                    "login": None,
+                    "total": 0,
+                }
+                self._contributor.update(
+                    (field, array("q")) for field in _COLUMNS
+                )
+
+            stack.append(punct)
+            self._keys.append(None)
+            self._expect_key = punct == b"{"
+
+        elif punct in b"}]":
+            if not stack:
+                raise ValueError("invalid contributor statistics")
+
+            stack.pop()
+            self._keys.pop()
+
+            if punct == b"}" and len(stack) == 1:
+                self._finish_contributor()
+
+        elif punct == b",":
+            self._expect_key = bool(stack) and stack[-1] == b"{"
+
+    def _string(self, raw):
+        if (
+            len(self._stack) == 3
+            and self._keys[1] == b"author"
+            and self._keys[2] == b"login"
+        ):
+            login = json.loads(b'"' + raw + b'"')
+            self._contributor["login"] = login.lower()
+
+    def _number(self, raw):
+        if len(self._stack) == 2 and self._keys[1] == b"total":
+            self._contributor["total"] = int(raw)
+
+    def _finish_contributor(self):
+        contributor = self._contributor
+        self._contributor = None
+
+        if self.result is None and contributor["login"] == self.login:
+            self.weeks = tuple(contributor[field] for field in _COLUMNS)
+            self.result = (
+                sum(contributor[b"a"]),
+                sum(contributor[b"d"]),
+                contributor["total"],
+            )
@@ -5,8 +5,13 @@ generate a random valid 3x3 scramble and generate an svg render. to be run daily
 
 import random
 import hashlib
+import os
 from datetime import date
 
+import svgterm
+from manifest import source_digest, write_if_changed
+from svgterm import COMPACT, Document, Panel, emit, line, rect, style, text
+
 SVG_WIDTH   = 1000
 SVG_HEIGHT  = 620
 CELL        = 42
@@ -221,20 +226,12 @@ def scramble_state(scramble: list[str]):
 
 
 #helpers for svg generation
-def escape(t):
-    return t.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-
-
-def svg_line(x: int, y: int, spans: list) -> str:
-    tspans = "".join(
-        f'<tspan fill="{color}">{escape(text)}</tspan>'
-        for text, color in spans
-    )
-    return f'<text x="{x}" y="{y}">{tspans}</text>'
-
-
 def draw_face(face_stickers, ox, oy):
-    """Return SVG rects for a 3x3 face at offset (ox, oy)."""
+    """Return SVG rects for a 3x3 face at offset (ox, oy).
+
+    Stickers only vary by colour, so after a few renders every rect is a
+    cache hit.
+    """
     out = []
     step = CELL + GAP
     for i, sticker in enumerate(face_stickers):
@@ -243,8 +240,8 @@ def draw_face(face_stickers, ox, oy):
         y = oy + row * step
         color = FACE_COLORS[sticker]
         out.append(
-            f'<rect x="{x}" y="{y}" width="{CELL}" height="{CELL}" '
-            f'rx="4" fill="{color}" stroke="{GRID_STROKE}" stroke-width="2"/>'
+            rect(x, y, CELL, CELL, color, radius=4,
+                 stroke=GRID_STROKE, stroke_width=2)
         )
     return "\n".join(out)
 
@@ -305,29 +302,13 @@ def generate_svg(today: date) -> str:
          ("─────────────────────────", COLOR_MUTED)],
     ]
 
-    svg_parts = [
-        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{SVG_HEIGHT}">',
-        f'<rect width="100%" height="100%" fill="{BG}"/>',
-        f'''
-        <style>
-            text {{
-                font-family: {FONT};
-                font-size: {FONT_SIZE}px;
-                white-space: pre;
-                dominant-baseline: text-before-edge;
-                letter-spacing: 0.3px;
-            }}
-        </style>
-        '''
-    ]
+    svg_parts = Document(SVG_WIDTH, SVG_HEIGHT, BG,
+                         style(FONT, FONT_SIZE, 0.3))
 
-    y = PADDING
-    for row in left_block:
-        if row:
-            svg_parts.append(svg_line(left_x, y, row))
-        y += LINE_HEIGHT
+    panel = Panel(left_x, PADDING, LINE_HEIGHT, left_block)
+    svg_parts.add(panel)
 
-    preview_y = y + 10
+    preview_y = panel.bottom + 10
     px = left_x
     py = preview_y
 
@@ -343,13 +324,11 @@ def generate_svg(today: date) -> str:
         else:
             col = MOVE_COL
 
-        svg_parts.append(
-            f'<text x="{px}" y="{py}" fill="{col}">{escape(move)}</text>'
-        )
+        svg_parts.add(text(px, py, move, col))
         px += 42
 
     for face, (fx, fy) in face_positions.items():
-        svg_parts.append(draw_face(state[face], fx, fy))
+        svg_parts.add(draw_face(state[face], fx, fy))
 
     meta_y = 470
     lines = [
@@ -360,27 +339,41 @@ def generate_svg(today: date) -> str:
 
     for i, (label, value) in enumerate(lines):
         yy = meta_y + i * 22
-        svg_parts.append(
-            svg_line(PADDING, yy, [
+        svg_parts.add(
+            line(PADDING, yy, (
                 (f"{label:<18}", COLOR_LABEL),
                 (" : " + value, COLOR_VALUE)
-            ])
+            ))
         )
 
-    svg_parts.append(
-        f'<text x="{PADDING}" y="{SVG_HEIGHT-28}" fill="{COLOR_PROMPT}" font-weight="bold">shavi@ShavirPC:~$</text>'
+    svg_parts.add(
+        text(PADDING, SVG_HEIGHT - 28, "shavi@ShavirPC:~$", COLOR_PROMPT,
+             bold=True)
     )
 
-    svg_parts.append("</svg>")
-    return "\n".join(svg_parts)
+    return svg_parts.render()
+
+
+def inputs(today):
+    """Everything the card for today depends on; config lives in the code."""
+    return {
+        "date": today.isoformat(),
+        "scramble": daily_scramble(today),
+        "code": source_digest(__file__, os.path.dirname(svgterm.__file__)),
+        "compact": COMPACT,
+    }
 
 
 def main():
     today = date.today()
-    svg   = generate_svg(today)
-    with open("cube_scramble.svg", "w", encoding="utf-8") as f:
-        f.write(svg)
-    print(f"cube_scramble.svg generated for {today}")
+    if write_if_changed(
+        "cube_scramble.svg",
+        inputs(today),
+        lambda: emit("cube_scramble.svg", generate_svg(today)),
+    ):
+        print(f"cube_scramble.svg generated for {today}")
+    else:
+        print(f"cube_scramble.svg unchanged for {today}, skipped")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,740 @@
+"""
+fake_github.py
+
+Local stand-in for the parts of the GitHub API that fetch_metrics.py
+uses, for benchmarking and regression-testing without a token.
+
+Serves:
+- POST /graphql: the batched user query, repository pages, discovered
+  organization repositories, batched commit counts, rateLimit and the
+  commit history of repositories answering 422
+- GET /repos/{owner}/{repo}/stats/contributors
+
+Every login is given a synthetic account of `repos` repositories,
+generated deterministically from the seed. Behaviour can be tuned:
+
+- latency: seconds added to every response
+- warmup: maximum number of 202 responses a repository returns before
+  its statistics are ready (each repository picks 0..warmup)
+- empty_rate / too_large_rate: share of repositories answering 204 / 422
+- error_rate: share of statistics requests answered with a 5xx
+- history_error_rate: share of commit-history pages answered with
+  GitHub's GraphQL timeout error instead of data
+- saml_errors: answer the organization-member discovery connection with
+  partial data plus a SAML enforcement error, as GitHub does for
+  organizations that have not authorized the token
+- rate_limit: primary budget per resource, reported in X-RateLimit-*
+  headers; requests beyond it are answered 403
+- throttle_every: answer every Nth request with 429 and Retry-After
+
+Responses carry ETags, and If-None-Match is answered with 304.
+
+Run standalone:
+    python scripts/fake_github.py --repos 100 --port 8000
+
+then point fetch_metrics.py at it:
+    GITHUB_TOKEN=x GITHUB_API_URL=http://127.0.0.1:8000 \\
+        python scripts/fetch_metrics.py
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LANGUAGES = ["Python", "C++", "Java", "PHP", "C", "TypeScript", "TeX"]
+
+# What GitHub answers when a query runs out of time.
+TIMEOUT_ERROR = (
+    "Something went wrong while executing your query. This may be the "
+    "result of a timeout, or it could be a GitHub bug."
+)
+
+SAML_ERROR = (
+    "Resource protected by organization SAML enforcement. You must grant "
+    "your Personal Access token access to this organization."
+)
+
+# Other contributors listed before the account owner in every response.
+OTHER_CONTRIBUTORS = 3
+
+# Weeks of history per contributor.
+WEEKS = 104
+
+# Every account has commit contributions from this year to 2026.
+FIRST_YEAR = 2019
+
+# Creation date reported for every repository.
+CREATED_AT = "2023-06-01T00:00:00Z"
+
+# Every login belongs to one organization, ORG_PREFIX + login, whose
+# repositories list the login as their main contributor. They are
+# reported as affiliated repositories, and the first half of them again
+# as contributed-to, so discovery has duplicates to remove.
+ORG_PREFIX = "org-"
+
+STATS_PATH = re.compile(r"^/repos/([^/]+)/([^/]+)/stats/contributors$")
+ALIASED_USER = re.compile(r"(\w+): user\(login: \$(\w+)\)")
+YEAR_BLOCK = re.compile(r'y(\d{4}): contributionsCollection\(from: "')
+ALIASED_REPOSITORY = re.compile(
+    r"(\w+): repository\(owner: \$(\w+), name: \$(\w+)\)"
+)
+
+
+def make_account(login, repo_count, seed=0, warmup=2,
+                 empty_rate=0.05, too_large_rate=0.02):
+    """Generate a deterministic synthetic account for a login."""
+
+    rng = random.Random(f"{seed}:{login}")
+    epoch = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    repos = []
+
+    for i in range(repo_count):
+        roll = rng.random()
+
+        if roll < empty_rate:
+            status = 204
+        elif roll < empty_rate + too_large_rate:
+            status = 422
+        else:
+            status = 200
+
+        pushed_at = epoch + timedelta(hours=rng.randrange(24 * 365))
+
+        repos.append(
+            {
+                "id": f"R_{login}_{i}",
+                "name": f"repo-{i:04d}",
+                "nameWithOwner": f"{login}/repo-{i:04d}",
+                "isFork": rng.random() < 0.1,
+                "pushedAt": pushed_at.isoformat().replace("+00:00", "Z"),
+                "stargazerCount": rng.randrange(5),
+                "forkCount": rng.randrange(2),
+                # Largest first, as requested with orderBy SIZE DESC.
+                "languages": {
+                    "edges": [
+                        {"size": size, "node": {"name": name}}
+                        for name, size in sorted(
+                            (
+                                (name, rng.randrange(1, 200000))
+                                for name in rng.sample(
+                                    LANGUAGES, rng.randint(1, 3)
+                                )
+                            ),
+                            key=lambda item: item[1],
+                            reverse=True,
+                        )
+                    ]
+                    if rng.random() < 0.9 else [],
+                },
+                # Not part of the GraphQL schema; stripped before sending.
+                "_status": status,
+                "_warmup": rng.randint(0, warmup),
+            }
+        )
+
+    return repos
+
+
+def contributors_payload(owner, repo_name, seed=0):
+    """
+    Build a /stats/contributors body; the owner (or, for an organization,
+    its member) is listed last.
+    """
+
+    rng = random.Random(f"{seed}:{owner}/{repo_name}")
+    week0 = int(datetime(2024, 1, 7, tzinfo=timezone.utc).timestamp())
+
+    contributors = []
+
+    logins = [f"contributor-{n}" for n in range(OTHER_CONTRIBUTORS)]
+    logins.append(owner.removeprefix(ORG_PREFIX))
+
+    for login in logins:
+        weeks = []
+
+        for w in range(WEEKS):
+            commits = rng.randrange(4) if rng.random() < 0.4 else 0
+
+            weeks.append(
+                {
+                    "w": week0 + w * 7 * 86400,
+                    "a": commits * rng.randrange(200),
+                    "d": commits * rng.randrange(80),
+                    "c": commits,
+                }
+            )
+
+        contributors.append(
+            {
+                "total": sum(week["c"] for week in weeks),
+                "weeks": weeks,
+                "author": {"login": login, "type": "User"},
+            }
+        )
+
+    return contributors
+
+
+def history_commits(owner, repo_name, seed=0):
+    """
+    The owner's commits, newest first, as (committedDate, additions,
+    deletions), spread over the weeks of contributors_payload so both
+    endpoints agree.
+    """
+
+    owner_weeks = contributors_payload(owner, repo_name, seed)[-1]["weeks"]
+    commits = []
+
+    for week in owner_weeks:
+        count = week["c"]
+
+        for i in range(count):
+            moment = datetime.fromtimestamp(
+                week["w"] + 3600 * (i + 1), timezone.utc
+            )
+            commits.append(
+                (
+                    moment.isoformat().replace("+00:00", "Z"),
+                    week["a"] // count + (week["a"] % count if i == 0 else 0),
+                    week["d"] // count + (week["d"] % count if i == 0 else 0),
+                )
+            )
+
+    commits.reverse()
+    return commits
+
+
+class FakeGitHub:
+    """Threaded fake API server with request counters."""
+
+    def __init__(self, repos=10, seed=0, latency=0.0, warmup=2,
+                 empty_rate=0.05, too_large_rate=0.02, error_rate=0.0,
+                 history_error_rate=0.0, saml_errors=False,
+                 rate_limit=5000, throttle_every=0,
+                 host="127.0.0.1", port=0):
+        self.repo_count = repos
+        self.seed = seed
+        self.latency = latency
+        self.warmup = warmup
+        self.empty_rate = empty_rate
+        self.too_large_rate = too_large_rate
+        self.error_rate = error_rate
+        self.history_error_rate = history_error_rate
+        self.saml_errors = saml_errors
+        self.rate_limit = rate_limit
+        self.throttle_every = throttle_every
+
+        self.stats = Counter()
+
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._accounts = {}
+        self._by_name = {}
+        self._polls = Counter()
+        self._used = Counter()
+        self._reset = int(time.time()) + 3600
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.server.serve_forever,
+            daemon=True,
+        )
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # Data
+
+    def account(self, login):
+        with self._lock:
+            if login not in self._accounts:
+                self._accounts[login] = make_account(
+                    login,
+                    self.repo_count,
+                    seed=self.seed,
+                    warmup=self.warmup,
+                    empty_rate=self.empty_rate,
+                    too_large_rate=self.too_large_rate,
+                )
+                self._by_name[login] = {
+                    repo["name"]: repo for repo in self._accounts[login]
+                }
+
+            return self._accounts[login]
+
+    def find(self, login, repo_name):
+        self.account(login)
+        return self._by_name[login].get(repo_name)
+
+    def summary(self):
+        """Request counters plus the number of distinct repositories
+        polled."""
+
+        with self._lock:
+            summary = dict(self.stats)
+            summary["repos_polled"] = len(self._polls)
+
+        return summary
+
+    def repository_page(self, login, first, after=None):
+        repos = self.account(login)
+        start = int(after.split(":")[1]) if after else 0
+        end = min(start + first, len(repos))
+
+        nodes = [
+            {key: value for key, value in repo.items()
+             if not key.startswith("_")}
+            for repo in repos[start:end]
+        ]
+
+        return {
+            "totalCount": len(repos),
+            "pageInfo": {
+                "hasNextPage": end < len(repos),
+                "endCursor": f"cursor:{end}",
+            },
+            "nodes": nodes,
+        }
+
+    def discovered_page(self, login, connection, first, after=None):
+        """A page of the organization repositories discovery finds."""
+
+        page = self.repository_page(ORG_PREFIX + login, first, after)
+
+        if connection == "contributed":
+            half = (page["totalCount"] + 1) // 2
+            start = int(after.split(":")[1]) if after else 0
+
+            page["nodes"] = page["nodes"][:max(0, half - start)]
+            page["totalCount"] = half
+            page["pageInfo"]["hasNextPage"] = start + first < half
+
+        return page
+
+    def user(self, login, page_size):
+        rng = random.Random(f"{self.seed}:{login}:profile")
+
+        return {
+            "id": f"U_{login}",
+            "login": login,
+            "followers": {"totalCount": rng.randrange(100)},
+            "following": {"totalCount": rng.randrange(100)},
+            "repositories": self.repository_page(login, page_size),
+            "contributionsCollection": {
+                "totalCommitContributions": rng.randrange(2000),
+                "contributionYears": list(range(FIRST_YEAR, 2027))[::-1],
+            },
+            "currentYear": {
+                "totalCommitContributions": self.year_commits(login, 2026),
+            },
+        }
+
+    def year_commits(self, login, year):
+        with self._lock:
+            self.stats["contribution_years"] += 1
+
+        rng = random.Random(f"{self.seed}:{login}:{year}")
+        return rng.randrange(1500)
+
+    def commit_count(self, owner, repo_name, author):
+        """A repository block of the batched commit-count query."""
+
+        repo = self.find(owner, repo_name)
+
+        if repo is None:
+            return None
+
+        if repo["_status"] == 204:
+            return {"defaultBranchRef": None}
+
+        owner_weeks = contributors_payload(owner, repo_name, self.seed)[-1]
+        count = (
+            owner_weeks["total"]
+            if author == f"U_{owner.removeprefix(ORG_PREFIX)}" else 0
+        )
+
+        return {
+            "defaultBranchRef": {
+                "target": {"history": {"totalCount": count}},
+            },
+        }
+
+    def history(self, owner, repo_name, author, first, after=None,
+                since=None, until=None):
+        commits = [
+            commit for commit in history_commits(owner, repo_name, self.seed)
+            if author == f"U_{owner.removeprefix(ORG_PREFIX)}"
+            and (since is None or commit[0] >= since)
+            and (until is None or commit[0] <= until)
+        ]
+
+        start = int(after.split(":")[1]) if after else 0
+        end = min(start + first, len(commits))
+
+        with self._lock:
+            self.stats["history_pages"] += 1
+
+        return {
+            "pageInfo": {
+                "hasNextPage": end < len(commits),
+                "endCursor": f"history:{end}",
+            },
+            "nodes": [
+                {
+                    "committedDate": date,
+                    "additions": additions,
+                    "deletions": deletions,
+                }
+                for date, additions, deletions in commits[start:end]
+            ],
+        }
+
+    # Rate limiting
+
+    def charge(self, resource, cost=1):
+        """Charge a request; returns the headers to send and whether the
+        budget is exhausted."""
+
+        with self._lock:
+            self.stats["requests"] += 1
+
+            if (
+                self.throttle_every
+                and self.stats["requests"] % self.throttle_every == 0
+            ):
+                return None, "throttled"
+
+            exhausted = self._used[resource] + cost > self.rate_limit
+
+            if not exhausted:
+                self._used[resource] += cost
+
+            remaining = self.rate_limit - self._used[resource]
+
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Used": str(self._used[resource]),
+            "X-RateLimit-Reset": str(self._reset),
+            "X-RateLimit-Resource": resource,
+        }
+
+        return headers, "exhausted" if exhausted else None
+
+    def rate_limit_field(self):
+        return {
+            "cost": 1,
+            "limit": self.rate_limit,
+            "remaining": self.rate_limit - self._used["graphql"],
+            "resetAt": datetime.fromtimestamp(self._reset, timezone.utc)
+            .isoformat().replace("+00:00", "Z"),
+        }
+
+    # HTTP
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            # Headers and body are written separately; without this,
+            # Nagle's algorithm adds ~40ms per keep-alive response.
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=None, headers=None):
+                payload = b"" if body is None else json.dumps(body).encode()
+
+                with fake._lock:
+                    fake.stats[f"status_{status}"] += 1
+
+                self.send_response(status)
+
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+
+                if status not in (204, 304):
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+
+                self.end_headers()
+
+                if status not in (204, 304):
+                    self.wfile.write(payload)
+
+            def refuse(self, reason, headers):
+                if reason == "throttled":
+                    self.send(
+                        429,
+                        {"message": "You have exceeded a secondary rate limit."},
+                        {"Retry-After": "1"},
+                    )
+                else:
+                    self.send(
+                        403,
+                        {"message": "API rate limit exceeded"},
+                        headers,
+                    )
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+
+                time.sleep(fake.latency)
+
+                with fake._lock:
+                    fake.stats["graphql"] += 1
+
+                headers, refused = fake.charge("graphql")
+
+                if refused:
+                    self.refuse(refused, headers)
+                    return
+
+                query = request.get("query", "")
+
+                # Only the history walk asks for additions.
+                if "additions" in query and fake.history_error_rate:
+                    with fake._lock:
+                        failed = fake._rng.random() < fake.history_error_rate
+
+                        if failed:
+                            fake.stats["graphql_errors"] += 1
+
+                    if failed:
+                        self.send(200, {
+                            "data": None,
+                            "errors": [{"message": TIMEOUT_ERROR}],
+                        }, headers)
+                        return
+
+                if "ORGANIZATION_MEMBER" in query and fake.saml_errors:
+                    with fake._lock:
+                        fake.stats["graphql_errors"] += 1
+
+                    self.send(200, {
+                        "data": self.resolve(request),
+                        "errors": [
+                            {"type": "FORBIDDEN", "message": SAML_ERROR}
+                        ],
+                    }, headers)
+                    return
+
+                self.send(200, {"data": self.resolve(request)}, headers)
+
+            def resolve(self, request):
+                query = request.get("query", "")
+                variables = request.get("variables") or {}
+                page_size = variables.get("pageSize", 100)
+
+                data = {}
+
+                if "rateLimit" in query:
+                    data["rateLimit"] = fake.rate_limit_field()
+
+                if "viewer" in query:
+                    data["viewer"] = {"login": "fake-viewer"}
+
+                aliases = ALIASED_USER.findall(query)
+                repositories = ALIASED_REPOSITORY.findall(query)
+
+                if YEAR_BLOCK.search(query):
+                    # One user block of year aliases per login, in order.
+                    starts = [
+                        match.start() for match in ALIASED_USER.finditer(query)
+                    ]
+
+                    for n, (alias, variable) in enumerate(aliases):
+                        block = query[starts[n]:(starts + [None])[n + 1]]
+                        data[alias] = {
+                            f"y{year}": {
+                                "totalCommitContributions": fake.year_commits(
+                                    variables[variable], int(year)
+                                ),
+                            }
+                            for year in YEAR_BLOCK.findall(block)
+                        }
+                elif repositories:
+                    for alias, owner, name in repositories:
+                        data[alias] = fake.commit_count(
+                            variables[owner],
+                            variables[name],
+                            variables["author"],
+                        )
+                elif aliases:
+                    for alias, variable in aliases:
+                        data[alias] = fake.user(variables[variable], page_size)
+                elif "history(" in query:
+                    history = fake.history(
+                        variables["owner"],
+                        variables["name"],
+                        variables["author"],
+                        page_size,
+                        variables.get("cursor"),
+                        variables.get("since"),
+                        variables.get("until"),
+                    )
+                    data["repository"] = {
+                        "defaultBranchRef": {
+                            "target": {"history": history},
+                        },
+                    }
+                elif "createdAt" in query:
+                    data["repository"] = {"createdAt": CREATED_AT}
+                elif "repositoriesContributedTo" in query:
+                    data["user"] = {
+                        "repositories": fake.discovered_page(
+                            variables["user"],
+                            "contributed",
+                            page_size,
+                            variables.get("cursor"),
+                        )
+                    }
+                elif "ORGANIZATION_MEMBER" in query:
+                    data["user"] = {
+                        "repositories": fake.discovered_page(
+                            variables["user"],
+                            "affiliated",
+                            page_size,
+                            variables.get("cursor"),
+                        )
+                    }
+                elif "$login" in query:
+                    data["user"] = {"id": f"U_{variables['login']}"}
+                elif "$cursor" in query:
+                    data["user"] = {
+                        "repositories": fake.repository_page(
+                            variables["user"],
+                            page_size,
+                            variables.get("cursor"),
+                        )
+                    }
+                else:
+                    data["user"] = fake.user(variables["user"], page_size)
+
+                return data
+
+            def do_GET(self):
+                time.sleep(fake.latency)
+
+                match = STATS_PATH.match(self.path)
+
+                if not match:
+                    self.send(404, {"message": "Not Found"})
+                    return
+
+                owner, repo_name = match.groups()
+
+                with fake._lock:
+                    fake.stats["stats"] += 1
+                    fake._polls[(owner, repo_name)] += 1
+                    polls = fake._polls[(owner, repo_name)]
+                    failed = fake._rng.random() < fake.error_rate
+
+                headers, refused = fake.charge("core")
+
+                if refused:
+                    self.refuse(refused, headers)
+                    return
+
+                repo = fake.find(owner, repo_name)
+
+                if repo is None:
+                    self.send(404, {"message": "Not Found"}, headers)
+                    return
+
+                if failed:
+                    self.send(502, {"message": "Server Error"}, headers)
+                    return
+
+                if polls <= repo["_warmup"]:
+                    self.send(202, {}, headers)
+                    return
+
+                if repo["_status"] != 200:
+                    self.send(repo["_status"], None, headers)
+                    return
+
+                body = contributors_payload(owner, repo_name, fake.seed)
+                etag = '"%s"' % hashlib.sha1(
+                    json.dumps(body).encode()
+                ).hexdigest()
+
+                headers["ETag"] = etag
+
+                if self.headers.get("If-None-Match") == etag:
+                    # Conditional hits are free on GitHub.
+                    with fake._lock:
+                        fake._used["core"] -= 1
+
+                    self.send(304, None, headers)
+                    return
+
+                self.send(200, body, headers)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[3])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--repos", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--history-error-rate", type=float, default=0.0)
+    parser.add_argument("--saml-errors", action="store_true")
+    parser.add_argument("--rate-limit", type=int, default=5000)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeGitHub(
+        repos=args.repos,
+        seed=args.seed,
+        latency=args.latency,
+        warmup=args.warmup,
+        error_rate=args.error_rate,
+        history_error_rate=args.history_error_rate,
+        saml_errors=args.saml_errors,
+        rate_limit=args.rate_limit,
+        throttle_every=args.throttle_every,
+        port=args.port,
+    )
+
+    print(f"Fake GitHub API listening on {fake.url}")
+
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(fake.summary())
+
+
+if __name__ == "__main__":
+    main()
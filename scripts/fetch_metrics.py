@@ -7,10 +7,10 @@ Metrics:
 - Repository count
 - Stars
 - Forks
-- GitHub contribution commits
+- GitHub commit contributions, lifetime (summed per contribution year)
 - Followers
 - Following
-- Primary languages
+- Languages, weighted by bytes of code
 - Total additions by ShavirV
 - Total deletions by ShavirV
 
@@ -18,401 +18,2068 @@ LOC is calculated using GitHub's contributor statistics endpoint rather
 than querying individual commit histories. This gives a much more
 representative lifetime contribution figure.
 
+The weekly figures behind those totals are kept per repository in
+metrics_weekly.bin next to metrics.json (see timeseries.py), so trends
+such as the last 4/12/52 weeks need no further API calls.
+
 GitHub's contributor statistics endpoint can initially return HTTP 202
 while GitHub calculates the statistics. The script automatically waits
 and retries in that situation.
+
+Usage:
+    python scripts/fetch_metrics.py                 # ShavirV -> metrics.json
+    python scripts/fetch_metrics.py alice bob ...   # -> metrics/<login>.json
+    METRICS_TRACE=trace.json python scripts/fetch_metrics.py
+    python scripts/fetch_metrics.py --check         # auth check, no writes
+    python scripts/fetch_metrics.py --discover --exclude big-org
+    python scripts/fetch_metrics.py --counts        # commit counts only
+    python scripts/fetch_metrics.py --record run.cassette
+    python scripts/fetch_metrics.py --replay run.cassette [--latency]
+
+METRICS_TRACE records where the run spends its time (requests, backoff
+sleeps, polling waits, aggregation) as Chrome trace JSON and prints a
+summary of the slowest phases.
+
+--discover also counts the LOC of repositories the user does not own:
+collaborator and organization repositories and those they contributed
+to, de-duplicated and filtered by owner (see DISCOVER).
+
+--counts skips the contributor statistics and prints only per-repository
+commit counts, batched COMMIT_COUNT_BATCH repositories per GraphQL
+request.
+
+--record saves every API exchange of a run to a cassette; --replay
+answers the same run from it offline, at memory speed or, with
+--latency, as slowly as it was recorded (see cassette.py).
+
+As a library (importing the module does no network I/O):
+    collector = MetricsCollector()
+    metrics = collector.collect("ShavirV")
+    metrics = await collector.collect_async("ShavirV")
 """
 
+import argparse
+import asyncio
+import contextlib
+import fnmatch
+import heapq
 import json
 import os
+import tempfile
+import threading
 import time
-from datetime import datetime, timezone
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
 
 import requests
 
+import tracing
+from cassette import Cassette, RecordingAdapter, ReplayAdapter
+from contributor_stats import ContributorStatsParser
+from history import (
+    DEFAULT_COST_BUDGET,
+    DEFAULT_WORKERS,
+    HistoryIncomplete,
+    HistoryWalker,
+)
+from http_cache import ResponseCache
+from manifest import stable_metrics, write_if_changed
+from metrics_store import MetricsStore
+from rate_limit import RATE_LIMIT_FIELDS, RateLimitedAdapter, RateLimiter
+from timeseries import WeeklySeries
+from transport import ACCEPT_ENCODING, TransportAdapter, TransportStats
+
 
 # Configuration
 
 USER = "ShavirV"
-TOKEN = os.getenv("GITHUB_TOKEN")
 
-if not TOKEN:
-    raise RuntimeError("GITHUB_TOKEN not set")
+# Passing several logins on the command line runs a batch over one
+# session and writes METRICS_DIR/<login>.json for each; the default
+# single-user run keeps writing metrics.json.
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
 
-GRAPHQL_URL = "https://api.github.com/graphql"
-API_URL = "https://api.github.com"
+# GitHub Actions sets both of these; overriding them points the script at
+# another server such as scripts/fake_github.py.
+API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GRAPHQL_URL = os.getenv("GITHUB_GRAPHQL_URL", f"{API_URL}/graphql")
 
 # Current GitHub REST API version.
 API_VERSION = "2026-03-10"
 
-# Number of times to retry repository statistics when GitHub returns 202.
+# Maximum number of requests per repository while GitHub returns 202.
 STATS_RETRIES = 10
 
-# Initial delay after a 202 response.
-STATS_RETRY_DELAY = 3
+# Initial delay after a 202 response; the n-th retry of a repository
+# waits n times this long after its previous answer.
+STATS_RETRY_DELAY = float(os.getenv("STATS_RETRY_DELAY", "3"))
 
-# General HTTP retries.
-HTTP_RETRIES = 3
+# Repositories requested per GraphQL page (GitHub's maximum is 100).
+REPOS_PAGE_SIZE = 100
 
+# Languages requested per repository, largest first. top_languages is
+# weighted by their byte sizes.
+LANGUAGES_PER_REPO = 10
 
-# HTTP session
+# Estimated GraphQL cost each batched query may spend. GitHub charges
+# for connection requests, not nodes: the total is divided by 100. One
+# user block asks for 1 repositories connection plus one languages
+# connection per repository, whatever LANGUAGES_PER_REPO is, so it
+# costs (1 + REPOS_PAGE_SIZE) / 100 points, about one. Its
+# REPOS_PAGE_SIZE * (1 + LANGUAGES_PER_REPO) nodes stay far below
+# GitHub's 500,000-node limit per query.
+GRAPHQL_BATCH_BUDGET = 25
 
-session = requests.Session()
+# Repositories per commit-count query (see commit_counts). Each block
+# only asks for a totalCount, so a full batch costs about one point.
+COMMIT_COUNT_BATCH = 50
 
-session.headers.update(
-    {
-        "Authorization": f"Bearer {TOKEN}",
-        "Accept": "application/vnd.github+json",
-        "X-GitHub-Api-Version": API_VERSION,
-    }
+# General HTTP retries.
+HTTP_RETRIES = 3
+
+# Read size for streaming contributor statistics bodies.
+STATS_CHUNK_SIZE = 64 * 1024
+
+# Maximum number of repositories whose contributor statistics are
+# requested at the same time. 1 issues the requests one at a time.
+STATS_WORKERS = int(os.getenv("STATS_WORKERS", "8"))
+
+# Conditional-request cache. The workflow persists this directory between
+# runs so unchanged repositories are answered with 304 Not Modified.
+CACHE_DIR = os.getenv("GITHUB_CACHE_DIR", ".cache/github")
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Per-repository contributor totals from the previous run, keyed by
+# "login/repo" together with the repository's pushedAt. Repositories
+# that have not been pushed to since are served from here without any
+# request. Persisted by the workflow alongside CACHE_DIR.
+REPO_STATE_PATH = os.getenv("REPO_STATE_PATH", ".cache/repo_state.json")
+
+# Repositories with 10,000+ commits get no contributor statistics (HTTP
+# 422); their LOC is summed from the GraphQL commit history instead, by
+# HISTORY_WORKERS date ranges at once, spending at most
+# HISTORY_COST_BUDGET points per run. Progress is checkpointed so an
+# unfinished walk resumes on the next run.
+HISTORY_WORKERS = DEFAULT_WORKERS
+HISTORY_COST_BUDGET = int(
+    os.getenv("HISTORY_COST_BUDGET", str(DEFAULT_COST_BUDGET))
+)
+HISTORY_CHECKPOINT_PATH = os.getenv(
+    "HISTORY_CHECKPOINT_PATH", ".cache/history_checkpoint.json"
 )
 
+# Commit contributions of each finished calendar year, per login. A past
+# year can no longer change, so it is fetched once and kept; only the
+# current year is requested every run (inside the metadata query).
+# Year blocks are packed CONTRIBUTION_YEARS_BATCH to a query.
+CONTRIBUTION_YEARS_PATH = os.getenv(
+    "CONTRIBUTION_YEARS_PATH", ".cache/contribution_years.json"
+)
+CONTRIBUTION_YEARS_BATCH = 50
+
+# Requests kept back from each rate-limit budget, and the cap on requests
+# in flight at once across the whole run (GitHub allows at most 100).
+RATE_LIMIT_RESERVE = 50
+MAX_CONCURRENT_REQUESTS = 20
+
+# Connection pool: one pool per host, each keeping enough keep-alive
+# connections for every request that may be in flight at once.
+POOL_CONNECTIONS = 2
+POOL_MAXSIZE = max(STATS_WORKERS, MAX_CONCURRENT_REQUESTS)
+
+# Per-request latency histograms, written next to metrics.json.
+TIMING_FILENAME = "metrics_timing.json"
+
+# Weekly contribution series of each metrics file, written next to it
+# (metrics.json -> metrics_weekly.bin). Also the source of the weekly
+# figures of repositories skipped as unchanged.
+SERIES_SUFFIX = "_weekly.bin"
+
+# Every run is also appended to this SQLite history (see
+# metrics_store.py), which the workflow persists alongside CACHE_DIR.
+METRICS_DB = os.getenv("METRICS_DB", ".cache/metrics.sqlite")
+
+# Opt-in discovery of repositories the user does not own: those they
+# collaborate on or reach through an organization, and those they have
+# contributed commits to. Their LOC and commits are added to the totals;
+# stars, forks and languages stay those of the user's own repositories.
+#
+# DISCOVER_INCLUDE / DISCOVER_EXCLUDE are comma-separated patterns
+# matched against "owner/name" (e.g. "my-org/*,friend/project"); with an
+# include list, only matching repositories are considered. At most
+# DISCOVER_MAX_PER_OWNER repositories are taken from any one owner, so
+# a large organization cannot dominate the run.
+#
+# A pattern without "/" names a whole owner ("my-org" is "my-org/*").
+# Users' discovery crawls run DISCOVERY_WORKERS at a time.
+DISCOVER = os.getenv("DISCOVER_REPOSITORIES", "") == "1"
+DISCOVER_INCLUDE = os.getenv("DISCOVER_INCLUDE", "")
+DISCOVER_EXCLUDE = os.getenv("DISCOVER_EXCLUDE", "")
+DISCOVER_MAX_PER_OWNER = int(os.getenv("DISCOVER_MAX_PER_OWNER", "50"))
+DISCOVERY_WORKERS = 4
 
-# GraphQL helper
+# Trailing windows, in weeks, reported in the summary.
+TREND_WINDOWS = (4, 12, 52)
 
-def graphql(query, variables=None):
-    """Execute a GitHub GraphQL query with retries."""
+# Chrome trace JSON of the run is written here when set.
+TRACE_PATH = os.getenv("METRICS_TRACE")
 
-    for attempt in range(HTTP_RETRIES):
-        try:
-            response = session.post(
-                GRAPHQL_URL,
-                json={
-                    "query": query,
-                    "variables": variables or {},
-                },
-                timeout=30,
-            )
 
-            print(
-                f"GraphQL: HTTP {response.status_code}, "
-                f"remaining={response.headers.get('X-RateLimit-Remaining')}"
-            )
 
-            # Retry transient GitHub errors.
-            if response.status_code in (502, 503, 504):
-                if attempt < HTTP_RETRIES - 1:
-                    delay = 2 ** attempt
-                    print(
-                        f"Transient GitHub error "
-                        f"{response.status_code}; "
-                        f"retrying in {delay}s..."
-                    )
-                    time.sleep(delay)
-                    continue
+# Fetch user/repository metadata
+#
+# Deliberately does NOT fetch commit histories.
 
-            response.raise_for_status()
+REPOSITORY_FIELDS = """
+      totalCount
 
-            result = response.json()
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
 
-            if "errors" in result:
-                raise RuntimeError(
-                    "GitHub GraphQL errors:\n"
-                    + json.dumps(result["errors"], indent=2)
-                )
+      nodes {
+        id
+        name
+        nameWithOwner
+        isFork
+        pushedAt
+        stargazerCount
+        forkCount
 
-            return result["data"]
+        languages(
+          first: %d
+          orderBy: { field: SIZE, direction: DESC }
+        ) {
+          edges {
+            size
+            node {
+              name
+            }
+          }
+        }
+      }
+""" % LANGUAGES_PER_REPO
 
-        except requests.RequestException as exc:
-            if attempt < HTTP_RETRIES - 1:
-                delay = 2 ** attempt
-                print(
-                    f"GraphQL request failed: {exc}; "
-                    f"retrying in {delay}s..."
-                )
-                time.sleep(delay)
-                continue
+USER_FIELDS = """
+fragment UserFields on User {
+  id
+  login
 
-            raise
+  followers {
+    totalCount
+  }
 
-    raise RuntimeError("GraphQL request failed after retries")
+  following {
+    totalCount
+  }
 
+  repositories(
+    ownerAffiliations: OWNER
+    first: $pageSize
+  ) {
+%s
+  }
 
-# Fetch user/repository metadata
-#
-# Deliberately does NOT fetch commit histories.
+  contributionsCollection {
+    totalCommitContributions
+    contributionYears
+  }
 
-USER_QUERY = """
-query($user: String!) {
+  currentYear: contributionsCollection(from: $yearStart) {
+    totalCommitContributions
+  }
+}
+""" % REPOSITORY_FIELDS
+
+REPOSITORIES_QUERY = """
+query($user: String!, $pageSize: Int!, $cursor: String) {
+%s
   user(login: $user) {
-    followers {
-      totalCount
+    repositories(
+      ownerAffiliations: OWNER
+      first: $pageSize
+      after: $cursor
+    ) {
+%s
     }
+  }
+}
+""" % (RATE_LIMIT_FIELDS, REPOSITORY_FIELDS)
+
+# Connections crawled by discovery, aliased to "repositories" so they
+# page like REPOSITORIES_QUERY.
+DISCOVERY_CONNECTIONS = {
+    "affiliated": """repositories(
+      ownerAffiliations: [COLLABORATOR, ORGANIZATION_MEMBER]""",
+    "contributed": """repositoriesContributedTo(
+      includeUserRepositories: false
+      contributionTypes: [COMMIT, PULL_REQUEST]""",
+}
 
-    following {
-      totalCount
+DISCOVERY_QUERY = """
+query($user: String!, $pageSize: Int!, $cursor: String) {
+%s
+  user(login: $user) {
+    repositories: %%s
+      first: $pageSize
+      after: $cursor
+    ) {
+%s
     }
+  }
+}
+""" % (RATE_LIMIT_FIELDS, REPOSITORY_FIELDS.replace("%", "%%"))
 
-    repositories(
-      ownerAffiliations: OWNER
-      first: 100
-    ) {
-      totalCount
+DISCOVERY_QUERIES = {
+    name: DISCOVERY_QUERY % connection
+    for name, connection in DISCOVERY_CONNECTIONS.items()
+}
 
-      nodes {
-        name
-        isFork
-        stargazerCount
-        forkCount
 
-        primaryLanguage {
-          name
+COMMIT_COUNT_FIELDS = """
+fragment CommitCount on Repository {
+  defaultBranchRef {
+    target {
+      ... on Commit {
+        history(author: { id: $author }) {
+          totalCount
         }
       }
     }
-
-    contributionsCollection {
-      totalCommitContributions
-    }
   }
 }
 """
 
 
-user_data = graphql(
-    USER_QUERY,
-    {"user": USER},
-)["user"]
+def build_commit_counts_query(count):
+    """
+    Build a query counting one author's default-branch commits in count
+    repositories, with one aliased repository(owner:, name:) block each.
+    """
+
+    variables = "".join(
+        f", $o{i}: String!, $n{i}: String!" for i in range(count)
+    )
+    blocks = "".join(
+        f"  r{i}: repository(owner: $o{i}, name: $n{i}) "
+        f"{{ ...CommitCount }}\n"
+        for i in range(count)
+    )
 
+    return (
+        f"query($author: ID!{variables}) {{\n"
+        f"{RATE_LIMIT_FIELDS}"
+        f"{blocks}"
+        f"}}\n"
+        + COMMIT_COUNT_FIELDS
+    )
 
-# Fetch contributor statistics
 
-def get_contributor_stats(repo_name):
+def build_users_query(count):
     """
-    Fetch contributor statistics for one repository.
+    Build a query with one aliased user(login:) block per login.
 
-    Returns:
-        (additions, deletions, commits)
+    The query also returns the authenticated viewer and the rate limit,
+    so a single request both checks the token and fetches all metadata.
+    """
 
-    GitHub may return HTTP 202 while it calculates the statistics.
-    In that case, wait and request the endpoint again.
+    variables = "".join(f", $u{i}: String!" for i in range(count))
+    blocks = "".join(
+        f"  u{i}: user(login: $u{i}) {{ ...UserFields }}\n"
+        for i in range(count)
+    )
+
+    return (
+        f"query($pageSize: Int!, $yearStart: DateTime!{variables}) {{\n"
+        f"{RATE_LIMIT_FIELDS}"
+        f"  viewer {{ login }}\n"
+        f"{blocks}"
+        f"}}\n"
+        + USER_FIELDS
+    )
+
+
+def year_start(year):
+    return f"{year}-01-01T00:00:00Z"
+
+
+def build_years_query(pending):
     """
+    Build a query for the commit contributions of past years.
 
-    url = (
-        f"{API_URL}/repos/"
-        f"{USER}/{repo_name}/stats/contributors"
+    pending is a list of (login, [year, ...]); every login gets an aliased
+    user block holding one aliased contributionsCollection(from:, to:)
+    per year, so all of them are answered by one request.
+    """
+
+    variables = "".join(f"$u{i}: String!, " for i in range(len(pending)))
+    blocks = []
+
+    for i, (_, years) in enumerate(pending):
+        fields = "".join(
+            f"    y{year}: contributionsCollection("
+            f'from: "{year_start(year)}", to: "{year}-12-31T23:59:59Z"'
+            f") {{ totalCommitContributions }}\n"
+            for year in years
+        )
+        blocks.append(f"  u{i}: user(login: $u{i}) {{\n{fields}  }}\n")
+
+    return (
+        f"query({variables.rstrip(', ')}) {{\n"
+        f"{RATE_LIMIT_FIELDS}"
+        f"{''.join(blocks)}"
+        f"}}\n"
     )
 
-    for attempt in range(STATS_RETRIES):
-        try:
-            response = session.get(
-                url,
-                timeout=30,
+
+# Metrics collection
+
+def new_tally():
+    return {
+        "repos": 0,
+        "stars": 0,
+        "forks": 0,
+        "languages": {},
+        "loc_added": 0,
+        "loc_removed": 0,
+        "commits": 0,
+
+        # Repositories found by discovery (not owned by the user).
+        "discovered": 0,
+
+        # repo name -> per-repository figures, for the metrics store
+        "repositories": {},
+    }
+
+
+def parse_patterns(value):
+    """Split a comma-separated DISCOVER_INCLUDE/EXCLUDE value."""
+
+    patterns = []
+
+    for pattern in value.split(","):
+        pattern = pattern.strip().lower()
+
+        if pattern:
+            patterns.append(pattern if "/" in pattern else f"{pattern}/*")
+
+    return patterns
+
+
+def discovery_allows(name_with_owner, include, exclude):
+    name = name_with_owner.lower()
+
+    if include and not any(
+        fnmatch.fnmatchcase(name, pattern) for pattern in include
+    ):
+        return False
+
+    return not any(fnmatch.fnmatchcase(name, pattern) for pattern in exclude)
+
+
+def add_contributions(tally, repo_name, additions, deletions, commits):
+    tally["loc_added"] += additions
+    tally["loc_removed"] += deletions
+    tally["commits"] += commits
+
+    tally["repositories"][repo_name].update(
+        additions=additions,
+        deletions=deletions,
+        commits=commits,
+    )
+
+
+def build_metrics(login, user_data, tally, lifetime_commits):
+    return {
+        "user": login,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+
+        # Repository statistics
+        "repos": user_data["repositories"]["totalCount"],
+        "stars": tally["stars"],
+        "forks": tally["forks"],
+
+        # Repositories of other owners included by discovery
+        "discovered_repos": tally["discovered"],
+
+        # GitHub profile commit contributions, lifetime and last year
+        "commits": lifetime_commits,
+        "commits_last_year": user_data["contributionsCollection"][
+            "totalCommitContributions"
+        ],
+
+        # Lifetime contributor statistics across repositories
+        "loc_added": tally["loc_added"],
+        "loc_removed": tally["loc_removed"],
+
+        # Profile
+        "followers": user_data["followers"]["totalCount"],
+        "following": user_data["following"]["totalCount"],
+
+        # Languages
+        "top_languages": dict(
+            sorted(
+                tally["languages"].items(),
+                key=lambda item: item[1],
+                reverse=True,
             )
+        ),
+    }
 
-            print(
-                f"  {repo_name}: "
-                f"HTTP {response.status_code}, "
-                f"remaining="
-                f"{response.headers.get('X-RateLimit-Remaining')}"
+
+def write_json_atomic(path, document):
+    """
+    Replace path with document as JSON. The data goes to a temporary
+    file of its own in the same directory first, so neither a crash nor
+    a concurrent writer leaves a partial file behind.
+    """
+
+    directory = os.path.dirname(path)
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    fd, temporary = tempfile.mkstemp(
+        dir=directory or ".",
+        prefix=f"{os.path.basename(path)}.",
+        suffix=".tmp",
+    )
+
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=1, sort_keys=True)
+
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class MetricsCollector:
+    """
+    Collects metrics.json documents for GitHub users.
+
+    The HTTP session, response cache and rate limiter are created on
+    first use and shared by every later collection, so a long-lived
+    process keeps its connections, cached responses and rate-limit
+    budget between calls.
+    """
+
+    def __init__(
+        self,
+        token=None,
+        api_url=API_URL,
+        graphql_url=GRAPHQL_URL,
+        stats_workers=STATS_WORKERS,
+        cache_dir=CACHE_DIR,
+        repo_state_path=REPO_STATE_PATH,
+        history_checkpoint_path=HISTORY_CHECKPOINT_PATH,
+        contribution_years_path=CONTRIBUTION_YEARS_PATH,
+        history_workers=HISTORY_WORKERS,
+        stats_retry_delay=STATS_RETRY_DELAY,
+        record=None,
+        replay=None,
+        replay_latency=False,
+        discover=DISCOVER,
+        discover_include=DISCOVER_INCLUDE,
+        discover_exclude=DISCOVER_EXCLUDE,
+        discover_max_per_owner=DISCOVER_MAX_PER_OWNER,
+    ):
+        self.token = token
+        self.api_url = api_url
+        self.graphql_url = graphql_url
+        self.stats_workers = stats_workers
+        self.stats_retry_delay = stats_retry_delay
+        self.cache_dir = cache_dir
+        self.repo_state_path = repo_state_path
+        self.contribution_years_path = contribution_years_path
+
+        self._session = None
+        self._session_lock = threading.Lock()
+
+        # login -> GraphQL node ID, for history(author:) filters.
+        self._user_ids = {}
+
+        # Login the token belongs to, set by fetch_users.
+        self.viewer = None
+
+        self.history = HistoryWalker(
+            self.graphql,
+            history_checkpoint_path,
+            workers=history_workers,
+            cost_budget=HISTORY_COST_BUDGET,
+        )
+
+        # Serialise read-modify-write cycles of the repository state and
+        # contribution years files.
+        self._state_lock = threading.Lock()
+        self._years_lock = threading.Lock()
+
+        # Cassettes (see cassette.py) to record every exchange into, or to
+        # answer every request from instead of the network.
+        self.record = record
+        self.replay = replay
+        self.replay_latency = replay_latency
+
+        # Repository discovery beyond the users' own repositories; the
+        # filters are comma-separated pattern strings (see DISCOVER).
+        self.discover = discover
+        self.discover_include = parse_patterns(discover_include)
+        self.discover_exclude = parse_patterns(discover_exclude)
+        self.discover_max_per_owner = discover_max_per_owner
+
+        self.response_cache = None
+        self.transport_stats = TransportStats()
+        self.rate_limiter = RateLimiter(
+            reserve=RATE_LIMIT_RESERVE,
+            max_concurrent=MAX_CONCURRENT_REQUESTS,
+        )
+
+    # HTTP session
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._create_session()
+
+            return self._session
+
+    def _create_session(self):
+        session = requests.Session()
+
+        if self.replay is not None:
+            adapter = ReplayAdapter(self.replay, self.replay_latency)
+
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+            return session
+
+        token = self.token or os.getenv("GITHUB_TOKEN")
+
+        if not token:
+            raise RuntimeError("GITHUB_TOKEN not set")
+
+        self.response_cache = ResponseCache(self.cache_dir, CACHE_MAX_BYTES)
+
+        # Every request passes through the rate limiter first, then the
+        # response cache and the timed, pooled transport.
+        adapter = RateLimitedAdapter(
+            TransportAdapter(
+                self.response_cache,
+                self.transport_stats,
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=max(self.stats_workers, POOL_MAXSIZE),
+            ),
+            self.rate_limiter,
+        )
+
+        if self.record is not None:
+            adapter = RecordingAdapter(adapter, self.record)
+
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        session.headers.update(
+            {
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/vnd.github+json",
+                "Accept-Encoding": ACCEPT_ENCODING,
+                "Connection": "keep-alive",
+                "X-GitHub-Api-Version": API_VERSION,
+            }
+        )
+
+        return session
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # GraphQL helper
+
+    @tracing.traced("graphql")
+    def graphql(self, query, variables=None):
+        """Execute a GitHub GraphQL query with retries."""
+
+        for attempt in range(HTTP_RETRIES):
+            try:
+                with tracing.span("POST graphql", "http") as span:
+                    response = self.session.post(
+                        self.graphql_url,
+                        json={
+                            "query": query,
+                            "variables": variables or {},
+                        },
+                        timeout=30,
+                    )
+
+                    span.set(status=response.status_code)
+
+                print(
+                    f"GraphQL: HTTP {response.status_code}, "
+                    f"remaining={response.headers.get('X-RateLimit-Remaining')}"
+                )
+
+                # Retry transient GitHub errors.
+                if response.status_code in (502, 503, 504):
+                    if attempt < HTTP_RETRIES - 1:
+                        delay = 2 ** attempt
+                        print(
+                            f"Transient GitHub error "
+                            f"{response.status_code}; "
+                            f"retrying in {delay}s..."
+                        )
+                        tracing.sleep(delay, "backoff")
+                        continue
+
+                response.raise_for_status()
+
+                result = response.json()
+
+                if "errors" in result:
+                    raise RuntimeError(
+                        "GitHub GraphQL errors:\n"
+                        + json.dumps(result["errors"], indent=2)
+                    )
+
+                data = result["data"]
+
+                if data.get("rateLimit"):
+                    self.rate_limiter.record_graphql(data["rateLimit"])
+
+                return data
+
+            except requests.RequestException as exc:
+                if attempt < HTTP_RETRIES - 1:
+                    delay = 2 ** attempt
+                    print(
+                        f"GraphQL request failed: {exc}; "
+                        f"retrying in {delay}s..."
+                    )
+                    tracing.sleep(delay, "backoff")
+                    continue
+
+                raise
+
+        raise RuntimeError("GraphQL request failed after retries")
+
+    # Fetch user/repository metadata
+
+    def fetch_users(self, logins):
+        """
+        Fetch profile data and the first repository page for many users.
+
+        Logins are packed into as few GraphQL requests as the cost budget
+        allows. Returns {login: user data} in the order of logins.
+        """
+
+        user_cost = (1 + REPOS_PAGE_SIZE) / 100
+        per_query = max(1, int(GRAPHQL_BATCH_BUDGET // user_cost))
+
+        users = {}
+
+        for start in range(0, len(logins), per_query):
+            batch = logins[start:start + per_query]
+
+            variables = {
+                "pageSize": REPOS_PAGE_SIZE,
+                "yearStart": year_start(datetime.now(timezone.utc).year),
+            }
+            variables.update(
+                {f"u{i}": login for i, login in enumerate(batch)}
             )
 
-            # Statistics are being generated.
-            if response.status_code == 202:
-                if attempt == STATS_RETRIES - 1:
+            data = self.graphql(build_users_query(len(batch)), variables)
+
+            self.viewer = data["viewer"]["login"]
+
+            for i, login in enumerate(batch):
+                if data.get(f"u{i}") is None:
+                    raise RuntimeError(f"GitHub user not found: {login}")
+
+                users[login] = data[f"u{i}"]
+                self._user_ids[login] = data[f"u{i}"]["id"]
+
+        return users
+
+    def user_id(self, login):
+        """GraphQL node ID of a user, as fetched by fetch_users."""
+
+        if login not in self._user_ids:
+            data = self.graphql(
+                "query($login: String!) { user(login: $login) { id } }",
+                {"login": login},
+            )
+            self._user_ids[login] = data["user"]["id"]
+
+        return self._user_ids[login]
+
+    def iter_repositories(self, user, first_page, query=REPOSITORIES_QUERY):
+        """
+        Yield every repository node, following pageInfo.endCursor.
+
+        first_page is the repositories connection already returned by
+        fetch_users, or None to request it with query as well. Later pages
+        are only requested once the caller has consumed the previous one,
+        so only one page is held at a time.
+        """
+
+        page = first_page
+        cursor = None
+
+        while True:
+            if page is None:
+                page = self.graphql(
+                    query,
+                    {
+                        "user": user,
+                        "pageSize": REPOS_PAGE_SIZE,
+                        "cursor": cursor,
+                    },
+                )["user"]["repositories"]
+
+            yield from page["nodes"]
+
+            if not page["pageInfo"]["hasNextPage"]:
+                return
+
+            cursor = page["pageInfo"]["endCursor"]
+            page = None
+
+    def discover_repositories(self, user):
+        """
+        Return the repository nodes found by every discovery connection,
+        crawled concurrently, in connection order. Nodes may repeat; the
+        caller de-duplicates them.
+
+        Discovery is an extra: a connection that fails (e.g. GraphQL
+        errors for organizations that enforce SAML and have not
+        authorized the token) is reported and contributes nothing, and
+        the run carries on with the rest.
+        """
+
+        with ThreadPoolExecutor(
+            max_workers=len(DISCOVERY_QUERIES),
+            thread_name_prefix="discovery",
+        ) as executor:
+            crawls = {
+                connection: executor.submit(
+                    lambda query: list(
+                        self.iter_repositories(user, None, query)
+                    ),
+                    query,
+                )
+                for connection, query in DISCOVERY_QUERIES.items()
+            }
+
+            nodes = []
+
+            for connection, crawl in crawls.items():
+                try:
+                    nodes.extend(crawl.result())
+                except (requests.RequestException, RuntimeError) as exc:
                     print(
-                        f"  WARNING: GitHub did not finish generating "
-                        f"statistics for {repo_name}"
+                        f"  WARNING: discovery of {connection} repositories "
+                        f"for {user} failed; skipping them: {exc}"
                     )
-                    return 0, 0, 0
 
-                delay = STATS_RETRY_DELAY * (attempt + 1)
+            return nodes
 
-                print(
-                    f"  Statistics are being generated; "
-                    f"retrying in {delay}s..."
+    # Lifetime commit contributions
+
+    def _load_contribution_years(self):
+        try:
+            with open(
+                self.contribution_years_path, "r", encoding="utf-8"
+            ) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_contribution_years(self, finished):
+        """Merge {login: {year: commits}} into the saved years."""
+
+        # Collections may run in parallel; re-read under the lock so
+        # years saved by another one since this one loaded are kept.
+        with self._years_lock:
+            saved = self._load_contribution_years()
+
+            for login, years in finished.items():
+                saved.setdefault(login, {}).update(years)
+
+            write_json_atomic(self.contribution_years_path, saved)
+
+    def lifetime_commits(self, users_data):
+        """
+        Sum every contribution year's commit contributions per user.
+
+        contributionsCollection covers at most one year, so each year in
+        contributionYears is counted separately: the current year comes
+        with the metadata query, finished years from the saved file, and
+        years not saved yet from aliased blocks, CONTRIBUTION_YEARS_BATCH
+        per request, sent concurrently. Returns {login: commits}.
+        """
+
+        now = datetime.now(timezone.utc)
+
+        # Late contributions in timezones behind UTC may still land on
+        # the last day of a year, so a year is only final a day later.
+        final_before = (now - timedelta(days=1)).year
+
+        saved = self._load_contribution_years()
+        counts = {}
+        pending = []
+
+        for login, user_data in users_data.items():
+            counts[login] = {
+                int(year): commits
+                for year, commits in saved.get(login, {}).items()
+            }
+            counts[login][now.year] = (
+                user_data["currentYear"]["totalCommitContributions"]
+            )
+
+            for year in user_data["contributionsCollection"][
+                "contributionYears"
+            ]:
+                if year not in counts[login]:
+                    pending.append((login, year))
+
+        batches = []
+
+        for start in range(0, len(pending), CONTRIBUTION_YEARS_BATCH):
+            years = {}
+
+            for login, year in pending[start:start + CONTRIBUTION_YEARS_BATCH]:
+                years.setdefault(login, []).append(year)
+
+            batches.append(list(years.items()))
+
+        def fetch(batch):
+            return batch, self.graphql(
+                build_years_query(batch),
+                {f"u{i}": login for i, (login, _) in enumerate(batch)},
+            )
+
+        if batches:
+            with tracing.span("contribution years", years=len(pending)):
+                with ThreadPoolExecutor(
+                    max_workers=len(batches),
+                    thread_name_prefix="years",
+                ) as executor:
+                    results = list(executor.map(fetch, batches))
+
+            finished = {}
+
+            for batch, data in results:
+                for i, (login, years) in enumerate(batch):
+                    for year in years:
+                        commits = data[f"u{i}"][f"y{year}"][
+                            "totalCommitContributions"
+                        ]
+                        counts[login][year] = commits
+
+                        if year < final_before:
+                            finished.setdefault(login, {})[str(year)] = (
+                                commits
+                            )
+
+            if finished:
+                self._save_contribution_years(finished)
+
+        return {
+            login: sum(
+                commits
+                for year, commits in counts[login].items()
+                if year in user_data["contributionsCollection"][
+                    "contributionYears"
+                ]
+                or year == now.year
+            )
+            for login, user_data in users_data.items()
+        }
+
+    # Commit counts
+
+    def commit_counts(self, user, repo_names):
+        """
+        Count the user's commits on the default branch of each repository,
+        COMMIT_COUNT_BATCH repositories per GraphQL request.
+
+        repo_names are names of the user's own repositories or
+        "owner/name". Returns {repo_name: commits}; repositories without a
+        default branch count 0. There is no 202 wait as with the
+        contributor statistics, but also no additions or deletions.
+        """
+
+        author = self.user_id(user)
+        repo_names = list(repo_names)
+        counts = {}
+
+        for start in range(0, len(repo_names), COMMIT_COUNT_BATCH):
+            batch = repo_names[start:start + COMMIT_COUNT_BATCH]
+
+            variables = {"author": author}
+
+            for i, repo_name in enumerate(batch):
+                owner, _, name = repo_name.rpartition("/")
+                variables[f"o{i}"] = owner or user
+                variables[f"n{i}"] = name
+
+            with tracing.span("commit counts", repos=len(batch)):
+                data = self.graphql(
+                    build_commit_counts_query(len(batch)), variables
+                )
+
+            for i, repo_name in enumerate(batch):
+                branch = (data.get(f"r{i}") or {}).get("defaultBranchRef")
+                counts[repo_name] = (
+                    branch["target"]["history"]["totalCount"] if branch else 0
+                )
+
+        return counts
+
+    def collect_commit_counts(self, user):
+        """
+        Fast path for when only commit counts are needed.
+
+        Returns {repo_name: commits} for the user's non-fork repositories,
+        plus discovered ones when discovery is enabled, from the metadata
+        query and one request per COMMIT_COUNT_BATCH repositories, instead
+        of one contributor statistics request (and its 202 polls) each.
+        """
+
+        user_data = self.fetch_users([user])[user]
+
+        seen = {}
+        repo_names = []
+
+        for repo in self.iter_repositories(user, user_data["repositories"]):
+            seen[repo["id"]] = repo["nameWithOwner"]
+
+            if not repo["isFork"]:
+                repo_names.append(repo["name"])
+
+        if self.discover:
+            repo_names.extend(
+                repo["nameWithOwner"]
+                for repo in self.select_discovered(
+                    self.discover_repositories(user), seen
                 )
+            )
+
+        return self.commit_counts(user, repo_names)
 
-                time.sleep(delay)
+    def select_discovered(self, discovered, seen):
+        """
+        Yield the discovered repository nodes to count: not forks, not
+        already in seen (node ID -> name, updated here), allowed by the
+        include/exclude patterns and within the per-owner cap.
+        """
+
+        per_owner = Counter()
+
+        for repo in discovered:
+            if repo["id"] in seen:
+                continue
+
+            seen[repo["id"]] = repo["nameWithOwner"]
+            owner = repo["nameWithOwner"].split("/")[0]
+
+            if (
+                repo["isFork"]
+                or not discovery_allows(
+                    repo["nameWithOwner"],
+                    self.discover_include,
+                    self.discover_exclude,
+                )
+                or per_owner[owner] >= self.discover_max_per_owner
+            ):
                 continue
 
-            # Empty repository.
-            if response.status_code == 204:
-                print(f"  {repo_name}: no contributor statistics")
-                return 0, 0, 0
+            per_owner[owner] += 1
+            yield repo
+
+    # Fetch contributor statistics
+
+    @tracing.traced("contributor_stats")
+    def get_contributor_stats(self, user, repo_name):
+        """
+        Request one user's contributor statistics for a repository once.
+
+        repo_name is the name of one of the user's own repositories, or
+        "owner/name" for a discovered repository owned by someone else.
+
+        Returns:
+            (additions, deletions, commits, weeks), or None while GitHub is
+            still generating the statistics (HTTP 202). weeks holds the
+            user's (week, additions, deletions, commits) columns, or None
+            when the repository has no statistics for them.
+
+        Transient HTTP errors are retried here and re-raised once retries are
+        exhausted; 202 polling is left to collect_contributor_stats so that
+        many repositories can wait at once.
+        """
+
+        owner, _, name = repo_name.rpartition("/")
+        owner = owner or user
+
+        url = (
+            f"{self.api_url}/repos/"
+            f"{owner}/{name}/stats/contributors"
+        )
+
+        label = f"{owner}/{name}"
+
+        for attempt in range(HTTP_RETRIES):
+            try:
+                with tracing.span("GET stats", "http", repo=label) as span:
+                    response = self.session.get(
+                        url,
+                        timeout=30,
+                        stream=True,
+                    )
+
+                    from_cache = getattr(response, "from_cache", False)
+                    span.set(status=response.status_code, cached=from_cache)
+
+                cached = " (cached)" if from_cache else ""
+
+                # Only a 200 body is streamed; anything else is small and is
+                # read whole so the connection can go back to the pool.
+                if response.status_code != 200:
+                    response.content
 
-            # Repository contains 10,000+ commits.
-            #
-            # GitHub documents that contributor additions/deletions become
-            # zero for repositories of this size.
-            if response.status_code == 422:
                 print(
-                    f"  WARNING: {repo_name} has too many commits "
-                    f"for contributor LOC statistics"
+                    f"  {label}: "
+                    f"HTTP {response.status_code}{cached}, "
+                    f"remaining="
+                    f"{response.headers.get('X-RateLimit-Remaining')}"
                 )
-                return 0, 0, 0
 
-            # Retry transient server errors.
-            if response.status_code in (500, 502, 503, 504):
+                # Statistics are being generated.
+                if response.status_code == 202:
+                    return None
+
+                # Empty repository.
+                if response.status_code == 204:
+                    print(f"  {label}: no contributor statistics")
+                    return 0, 0, 0, None
+
+                # Repository contains 10,000+ commits.
+                #
+                # GitHub documents that contributor additions/deletions become
+                # zero for repositories of this size, so walk the user's
+                # commits in the GraphQL history instead.
+                if response.status_code == 422:
+                    print(
+                        f"  {label} has too many commits for contributor "
+                        f"LOC statistics; walking the commit history..."
+                    )
+
+                    additions, deletions, commits, weeks = self.history.walk(
+                        owner, name, self.user_id(user)
+                    )
+
+                    print(
+                        f"  {label}: "
+                        f"{commits:,} commits, "
+                        f"+{additions:,} / -{deletions:,} (history)"
+                    )
+
+                    return additions, deletions, commits, weeks
+
+                # Retry transient server errors.
+                if response.status_code in (500, 502, 503, 504):
+                    if attempt < HTTP_RETRIES - 1:
+                        delay = 2 ** attempt
+
+                        print(
+                            f"  Transient error {response.status_code}; "
+                            f"retrying in {delay}s..."
+                        )
+
+                        tracing.sleep(delay, "backoff")
+                        continue
+
+                response.raise_for_status()
+
+                # Find the user in the contributor list while the body
+                # streams in, without building the full list.
+                parser = ContributorStatsParser(user)
+
+                with tracing.span("parse stats", repo=label):
+                    try:
+                        for chunk in response.iter_content(STATS_CHUNK_SIZE):
+                            parser.feed(chunk)
+
+                        parser.close()
+                    except ValueError as exc:
+                        raise requests.exceptions.InvalidJSONError(
+                            f"{label}: {exc}", response=response
+                        ) from exc
+
+                if parser.result is not None:
+                    additions, deletions, commits = parser.result
+
+                    print(
+                        f"  {label}: "
+                        f"{commits:,} commits, "
+                        f"+{additions:,} / -{deletions:,}"
+                    )
+
+                    return additions, deletions, commits, parser.weeks
+
+                # User did not appear as a contributor.
+                print(f"  {label}: no contributions found")
+                return 0, 0, 0, None
+
+            except requests.RequestException as exc:
                 if attempt < HTTP_RETRIES - 1:
                     delay = 2 ** attempt
 
                     print(
-                        f"  Transient error {response.status_code}; "
+                        f"  Request failed: {exc}; "
                         f"retrying in {delay}s..."
                     )
 
-                    time.sleep(delay)
+                    tracing.sleep(delay, "backoff")
                     continue
 
-            response.raise_for_status()
+                raise
 
-            contributors = response.json()
+        return 0, 0, 0, None
 
-            # Find ShavirV in the contributor list.
-            for contributor in contributors:
-                author = contributor.get("author")
+    def collect_contributor_stats(self, repositories):
+        """
+        Fetch contributor statistics for many repositories.
 
-                if not author:
-                    continue
+        repositories is an iterable of (user, repo_name) pairs, possibly a
+        generator that pages through the GitHub API, and may span several
+        users. Yields ((user, repo_name), statistics) as each repository
+        finishes, in completion order, where statistics is the result of
+        get_contributor_stats, or None for repositories that failed or timed
+        out.
+
+        Warm-up: one request per repository is fired as soon as its name is
+        produced, so GitHub starts generating every cold repository's
+        statistics at once, and the requests for one page overlap with
+        fetching the next.
+
+        Collection: repositories that answered 202 are polled again from a
+        priority queue ordered by the time they next become eligible, with
+        linear backoff per repository counted from its previous answer.
+        A repository is counted as timed out only after STATS_RETRIES
+        answers of 202, never for time spent queued behind other
+        repositories, waiting for a worker or held by the rate limiter.
+
+        Only in-flight requests and repositories still waiting on GitHub are
+        held in memory, never the full list of repositories.
+        """
+
+        started = time.monotonic()
+
+        finished = 0
+        failed = 0
+
+        # future -> (polls before this one, (user, repo_name))
+        in_flight = {}
 
-                login = author.get("login")
+        # (eligible_at, polls so far, (user, repo_name))
+        pending = []
 
-                if login and login.lower() == USER.lower():
-                    additions = 0
-                    deletions = 0
-                    commits = contributor.get("total", 0)
+        # Repositories that used up STATS_RETRIES polls.
+        exhausted = []
 
-                    for week in contributor.get("weeks", []):
-                        additions += week.get("a", 0)
-                        deletions += week.get("d", 0)
+        def complete(done):
+            nonlocal finished, failed
 
+            for future in done:
+                polls, repository = in_flight.pop(future)
+
+                try:
+                    outcome = future.result()
+                except (requests.RequestException, HistoryIncomplete) as exc:
                     print(
-                        f"  {repo_name}: "
-                        f"{commits:,} commits, "
-                        f"+{additions:,} / -{deletions:,}"
+                        f"  WARNING: failed to retrieve statistics "
+                        f"for {'/'.join(repository)}: {exc}"
                     )
+                    failed += 1
+                    yield repository, None
+                    continue
 
-                    return additions, deletions, commits
+                if outcome is not None:
+                    finished += 1
+                    yield repository, outcome
+                    continue
 
-            # User did not appear as a contributor.
-            print(f"  {repo_name}: no contributions found")
-            return 0, 0, 0
+                polls += 1
 
-        except requests.RequestException as exc:
-            if attempt < HTTP_RETRIES - 1:
-                delay = 2 ** attempt
+                if polls >= STATS_RETRIES:
+                    exhausted.append(repository)
+                    continue
 
-                print(
-                    f"  Request failed: {exc}; "
-                    f"retrying in {delay}s..."
+                heapq.heappush(
+                    pending,
+                    (
+                        time.monotonic() + self.stats_retry_delay * polls,
+                        polls,
+                        repository,
+                    ),
                 )
 
-                time.sleep(delay)
-                continue
+        with ThreadPoolExecutor(max_workers=self.stats_workers) as executor:
+            # Warm-up phase
+
+            with tracing.span("warm-up"):
+                for repository in repositories:
+                    future = executor.submit(
+                        self.get_contributor_stats, *repository
+                    )
+                    in_flight[future] = (0, repository)
+
+                    # Keep a bounded backlog instead of queueing every
+                    # repository.
+                    if len(in_flight) >= 2 * self.stats_workers:
+                        with tracing.span("wait for workers", "wait"):
+                            done, _ = wait(
+                                in_flight, return_when=FIRST_COMPLETED
+                            )
+
+                        yield from complete(done)
+
+            # Collection phase
+
+            with tracing.span("collection"):
+                if pending:
+                    print()
+                    print(
+                        f"{len(pending)} repositories are generating "
+                        f"statistics; polling each up to {STATS_RETRIES} "
+                        f"times..."
+                    )
+                    print()
+
+                while in_flight or pending:
+                    now = time.monotonic()
+
+                    while pending and pending[0][0] <= now:
+                        _, polls, repository = heapq.heappop(pending)
+                        future = executor.submit(
+                            self.get_contributor_stats, *repository
+                        )
+                        in_flight[future] = (polls, repository)
+
+                    timeout = None
+
+                    if pending:
+                        timeout = max(0, pending[0][0] - now)
+
+                    if not in_flight:
+                        tracing.sleep(timeout, "poll delay")
+                        continue
+
+                    with tracing.span("wait for workers", "wait"):
+                        done, _ = wait(
+                            in_flight,
+                            timeout=timeout,
+                            return_when=FIRST_COMPLETED,
+                        )
 
+                    yield from complete(done)
+
+        timed_out = sorted(exhausted)
+
+        for repository in timed_out:
             print(
-                f"  WARNING: failed to retrieve statistics "
-                f"for {repo_name}: {exc}"
+                f"  WARNING: GitHub did not finish generating "
+                f"statistics for {'/'.join(repository)}"
+            )
+
+            yield repository, None
+
+        print()
+        print(
+            f"Contributor statistics: {finished} finished, "
+            f"{len(timed_out)} timed out, "
+            f"{failed} failed "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+    # Repository state
+
+    def load_repo_state(self):
+        try:
+            with open(self.repo_state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_repo_state(self, logins, state):
+        """
+        Replace the saved entries of logins with state.
+
+        Only repositories seen in this collection are kept for these
+        users, so deleted or renamed repositories drop out. Other users'
+        entries are left alone.
+        """
+
+        with self._state_lock:
+            saved = self.load_repo_state()
+
+            prefixes = tuple(f"{login}/" for login in logins)
+            saved = {
+                key: value
+                for key, value in saved.items()
+                if not key.startswith(prefixes)
+            }
+            saved.update(state)
+
+            # A run killed mid-write must not leave a truncated file, or
+            # every repository would be re-collected next time.
+            write_json_atomic(self.repo_state_path, saved)
+
+    # Collection
+
+    def collect(self, user):
+        """Collect the metrics.json document for one user."""
+
+        return self.collect_many([user])[user]
+
+    def collect_many(self, logins):
+        """Collect metrics for several users; returns {login: metrics}."""
+
+        return {
+            login: metrics
+            for login, (metrics, _, _) in self._collect(logins).items()
+        }
+
+    async def collect_async(self, user):
+        """
+        Collect metrics for one user without blocking the event loop.
+
+        The work runs on a thread; requests are already concurrent inside
+        a collection, so several collections may be awaited together.
+        """
+
+        return await asyncio.to_thread(self.collect, user)
+
+    async def collect_many_async(self, logins):
+        return await asyncio.to_thread(self.collect_many, logins)
+
+    def _collect(self, logins, previous_series=None):
+        """
+        Returns {login: (metrics, tally, WeeklySeries)}.
+
+        previous_series maps logins to the series saved by the previous
+        run. When it is given, unchanged repositories are only skipped if
+        their weekly figures can be carried over from it.
+        """
+
+        logins = list(logins)
+
+        with tracing.span("fetch users", users=len(logins)):
+            users_data = self.fetch_users(logins)
+
+        print(f"Authenticated as {self.viewer}")
+
+        tallies = {login: new_tally() for login in logins}
+
+        previous_state = self.load_repo_state()
+        repo_state = {}
+
+        # login -> {"login/repo": (primary language, weekly columns)}
+        weekly = {login: {} for login in logins}
+
+        # (pushedAt, primary language) of repositories whose statistics
+        # are being fetched.
+        fetching = {}
+
+        def previous_weeks(login, key):
+            if previous_series is None or login not in previous_series:
+                return None
+
+            return previous_series[login].repo_weeks(key)
+
+        skipped = 0
+
+        def changed(login, repo_name, repo, language_name):
+            """
+            Record a repository in the tally and return whether its
+            statistics must be fetched.
+
+            Repositories whose pushedAt matches the saved state contribute
+            their saved totals directly instead.
+            """
+
+            nonlocal skipped
+
+            # Contributions are filled in by add_contributions.
+            tallies[login]["repositories"][repo_name] = {
+                "language": language_name,
+                "stars": repo["stargazerCount"],
+                "forks": repo["forkCount"],
+                "pushed_at": repo["pushedAt"],
+                "additions": None,
+                "deletions": None,
+                "commits": None,
+            }
+
+            key = f"{login}/{repo_name}"
+            saved = previous_state.get(key)
+            weeks = previous_weeks(login, key)
+
+            if (
+                saved
+                and saved["pushed_at"] == repo["pushedAt"]
+                and (previous_series is None or weeks is not None)
+            ):
+                add_contributions(
+                    tallies[login],
+                    repo_name,
+                    saved["additions"],
+                    saved["deletions"],
+                    saved["commits"],
+                )
+                repo_state[key] = saved
+
+                if weeks is not None:
+                    weekly[login][key] = (language_name, weeks)
+
+                skipped += 1
+                return False
+
+            fetching[key] = (repo["pushedAt"], language_name)
+            return True
+
+        def repositories(crawler):
+            """
+            Yield (user, repo_name) for every user's non-fork repositories
+            that changed since the previous run: their own, then, with
+            discovery enabled, the ones they work on elsewhere.
+
+            Stars, forks and languages are tallied as each page arrives, so
+            the repository nodes are never collected into a list. Discovered
+            repositories are crawled in the background meanwhile; they are
+            named "owner/name" and only add to the LOC and commit totals.
+            """
+
+            discoveries = {
+                login: crawler.submit(self.discover_repositories, login)
+                for login in (users_data if self.discover else ())
+            }
+
+            for login, user_data in users_data.items():
+                tally = tallies[login]
+
+                # Repository node ID -> first name seen, so a repository
+                # reachable in several ways is only counted once.
+                seen = {}
+
+                for repo in self.iter_repositories(
+                    login, user_data["repositories"]
+                ):
+                    seen[repo["id"]] = repo["nameWithOwner"]
+
+                    if repo["isFork"]:
+                        continue
+
+                    tally["repos"] += 1
+
+                    tally["stars"] += repo["stargazerCount"]
+                    tally["forks"] += repo["forkCount"]
+
+                    # Languages, by bytes of code
+
+                    edges = repo["languages"]["edges"]
+
+                    for edge in edges:
+                        name = edge["node"]["name"]
+
+                        tally["languages"][name] = (
+                            tally["languages"].get(name, 0) + edge["size"]
+                        )
+
+                    # The largest language stands for the repository in
+                    # the weekly series and the metrics store.
+                    language_name = edges[0]["node"]["name"] if edges else None
+
+                    if changed(login, repo["name"], repo, language_name):
+                        yield login, repo["name"]
+
+                if login not in discoveries:
+                    continue
+
+                with tracing.span("discover repositories", user=login):
+                    discovered = discoveries[login].result()
+
+                for repo in self.select_discovered(discovered, seen):
+                    tally["discovered"] += 1
+
+                    edges = repo["languages"]["edges"]
+                    language_name = edges[0]["node"]["name"] if edges else None
+
+                    if changed(
+                        login, repo["nameWithOwner"], repo, language_name
+                    ):
+                        yield login, repo["nameWithOwner"]
+
+        total_repositories = sum(
+            user_data["repositories"]["totalCount"]
+            for user_data in users_data.values()
+        )
+
+        print()
+        print(
+            f"Processing {total_repositories} repositories for "
+            f"{len(logins)} user(s) ({self.stats_workers} concurrent)..."
+        )
+        print()
+
+        # Contributor statistics
+        #
+        # Repositories are polled concurrently, so the 202 waits overlap
+        # and the total wait tracks the slowest repository rather than the
+        # sum of all of them. The totals are plain sums, so completion
+        # order does not matter.
+
+        crawler = ThreadPoolExecutor(
+            max_workers=DISCOVERY_WORKERS, thread_name_prefix="crawler"
+        )
+        lifetime_commits = crawler.submit(self.lifetime_commits, users_data)
+        stats = self.collect_contributor_stats(repositories(crawler))
+
+        with crawler, tracing.span("aggregate statistics"):
+            for (login, repo_name), outcome in stats:
+                key = f"{login}/{repo_name}"
+                pushed_at, language_name = fetching.pop(key)
+
+                if outcome is None:
+                    # Fall back to the last known figures rather than zeros,
+                    # but keep the old pushedAt so the repository is fetched
+                    # again next run.
+                    saved = previous_state.get(key)
+
+                    if saved:
+                        add_contributions(
+                            tallies[login],
+                            repo_name,
+                            saved["additions"],
+                            saved["deletions"],
+                            saved["commits"],
+                        )
+                        repo_state[key] = saved
+
+                    weeks = previous_weeks(login, key)
+
+                    if weeks is not None:
+                        weekly[login][key] = (language_name, weeks)
+
+                    continue
+
+                additions, deletions, commits, weeks = outcome
+
+                add_contributions(
+                    tallies[login], repo_name, additions, deletions, commits
+                )
+
+                # Repositories without statistics keep an empty row, so
+                # the next run knows they were fetched.
+                weekly[login][key] = (language_name, weeks or ([],) * 4)
+
+                repo_state[key] = {
+                    "pushed_at": pushed_at,
+                    "additions": additions,
+                    "deletions": deletions,
+                    "commits": commits,
+                }
+
+        with tracing.span("save repository state"):
+            self.save_repo_state(logins, repo_state)
+
+        print(
+            f"Skipped {skipped} unchanged repositories "
+            f"(state: {self.repo_state_path})"
+        )
+
+        lifetime_commits = lifetime_commits.result()
+
+        return {
+            login: (
+                build_metrics(
+                    login,
+                    user_data,
+                    tallies[login],
+                    lifetime_commits[login],
+                ),
+                tallies[login],
+                WeeklySeries.from_repositories(weekly[login]),
             )
+            for login, user_data in users_data.items()
+        }
 
-            return 0, 0, 0
 
-    return 0, 0, 0
+# Output
 
-# Process repositories
+def metrics_path(login, batch):
+    if not batch:
+        return "metrics.json"
 
-repos = [
-    repo
-    for repo in user_data["repositories"]["nodes"]
-    if not repo["isFork"]
-]
+    return os.path.join(METRICS_DIR, f"{login}.json")
 
 
-language_count = {}
+def series_path(login, batch):
+    return os.path.splitext(metrics_path(login, batch))[0] + SERIES_SUFFIX
 
-stars = 0
-forks = 0
 
-loc_added = 0
-loc_removed = 0
+def load_series(path):
+    try:
+        return WeeklySeries.load(path)
+    except (OSError, ValueError):
+        return WeeklySeries()
 
-contributor_commits = 0
 
+def write_metrics(metrics, path):
+    """
+    Write metrics to path unless only volatile fields (generated_at)
+    changed since the last write. Returns whether the file was written.
+    """
 
-print()
-print(f"Processing {len(repos)} repositories...")
-print()
+    return write_if_changed(
+        path,
+        stable_metrics(metrics),
+        lambda: json.dumps(metrics, indent=2),
+    )
+
+
+def print_summary(path, metrics, tally, series, written=True):
+    print()
+    print("=" * 50)
+    print(f"{path} updated" if written else f"{path} unchanged, not written")
+    print("=" * 50)
+    print(f"Repositories:       {metrics['repos']} ({tally['repos']} non-fork)")
+    print(f"Stars:              {metrics['stars']}")
+    print(f"Forks:              {metrics['forks']}")
+
+    if tally["discovered"]:
+        print(f"Discovered repos:   {tally['discovered']}")
+
+    print(
+        f"GitHub commits:     {metrics['commits']:,} lifetime, "
+        f"{metrics['commits_last_year']:,} last year"
+    )
+    print(f"Contributor commits:{tally['commits']}")
+    print(f"LOC added:          {metrics['loc_added']:,}")
+    print(f"LOC removed:        {metrics['loc_removed']:,}")
+
+    for window in TREND_WINDOWS:
+        added, removed = series.recent_loc(window)
+        print(f"LOC last {window:>2} weeks:  +{added:,} / -{removed:,}")
 
+    print(f"Followers:          {metrics['followers']}")
+    print(f"Following:          {metrics['following']}")
+    print("=" * 50)
 
-for repo in repos:
-    repo_name = repo["name"]
 
-    stars += repo["stargazerCount"]
-    forks += repo["forkCount"]
+# MAIN
 
-    # Primary language
+def check(collector, logins):
+    """
+    Dry run: send the metadata query once and report what it returned.
+
+    Verifies the token and shows the remaining budget without requesting
+    any statistics or writing any files.
+    """
 
-    language = repo.get("primaryLanguage")
+    users = collector.fetch_users(logins)
 
-    if language:
-        language_name = language["name"]
+    print()
+    print(f"Authenticated as:   {collector.viewer}")
 
-        language_count[language_name] = (
-            language_count.get(language_name, 0) + 1
+    for login, user_data in users.items():
+        print(
+            f"{login + ':':<20}"
+            f"{user_data['repositories']['totalCount']} repositories, "
+            f"{user_data['followers']['totalCount']} followers"
         )
 
-    # Contributor statistics
+    for line in collector.rate_limiter.summary():
+        print(f"Rate limit:         {line}")
 
-    additions, deletions, commits = get_contributor_stats(repo_name)
 
-    loc_added += additions
-    loc_removed += deletions
-    contributor_commits += commits
+def print_commit_counts(collector, logins):
+    """--counts: print per-repository commit counts; writes nothing."""
 
-# Build metrics
+    for login in logins:
+        started = time.perf_counter()
+        counts = collector.collect_commit_counts(login)
+        elapsed = time.perf_counter() - started
 
-metrics = {
-    "user": USER,
-    "generated_at": datetime.now(timezone.utc).isoformat(),
+        print()
+        print(f"{login}: {sum(counts.values()):,} commits")
 
-    # Repository statistics
-    "repos": user_data["repositories"]["totalCount"],
-    "stars": stars,
-    "forks": forks,
+        for repo_name, commits in sorted(
+            counts.items(), key=lambda item: (-item[1], item[0])
+        ):
+            print(f"  {repo_name:<40} {commits:>8,}")
 
-    # GitHub profile contribution count
-    "commits": user_data["contributionsCollection"][
-        "totalCommitContributions"
-    ],
+        print(f"  ({len(counts)} repositories in {elapsed:.2f}s)")
 
-    # Lifetime contributor statistics across repositories
-    "loc_added": loc_added,
-    "loc_removed": loc_removed,
 
-    # Profile
-    "followers": user_data["followers"]["totalCount"],
-    "following": user_data["following"]["totalCount"],
+def save_cassette(collector, path):
+    collector.record.save(path)
 
-    # Languages
-    "top_languages": dict(
-        sorted(
-            language_count.items(),
-            key=lambda item: item[1],
-            reverse=True,
+    print()
+    print(
+        f"Cassette:           {len(collector.record)} exchanges "
+        f"written to {path}, {os.path.getsize(path):,} bytes"
+    )
+
+
+def cassette_options(args, state_dir):
+    """
+    MetricsCollector arguments for --record and --replay.
+
+    Both start from empty state in state_dir, so a replay sends exactly
+    the requests that were recorded: no repository is skipped as
+    unchanged, no response is revalidated, and the history walk starts
+    over in a single date range (the bounds of several would depend on
+    the current time).
+    """
+
+    options = {
+        "cache_dir": os.path.join(state_dir, "github"),
+        "repo_state_path": os.path.join(state_dir, "repo_state.json"),
+        "history_checkpoint_path": os.path.join(
+            state_dir, "history_checkpoint.json"
+        ),
+        "contribution_years_path": os.path.join(
+            state_dir, "contribution_years.json"
+        ),
+        "history_workers": 1,
+    }
+
+    if args.record:
+        options["record"] = Cassette()
+    else:
+        options["replay"] = Cassette.load(args.replay)
+        options["replay_latency"] = args.latency
+
+        # Without the original latencies, 202 polls are answered at once
+        # and only limited by STATS_RETRIES.
+        if not args.latency:
+            options["stats_retry_delay"] = 0
+
+    return options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fetch GitHub metrics for the README"
+    )
+    parser.add_argument(
+        "logins",
+        nargs="*",
+        help=f"GitHub users (default: {USER} -> metrics.json)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only check the token with the metadata query; write nothing "
+             "but a --record cassette",
+    )
+    parser.add_argument(
+        "--counts",
+        action="store_true",
+        help="only print per-repository commit counts (batched GraphQL); "
+             "write nothing but a --record cassette",
+    )
+    parser.add_argument(
+        "--discover",
+        action="store_true",
+        default=DISCOVER,
+        help="also count collaborator, organization and contributed-to "
+             "repositories",
+    )
+    parser.add_argument(
+        "--include",
+        metavar="PATTERNS",
+        default=DISCOVER_INCLUDE,
+        help="discover only owner/name patterns (comma-separated; "
+             "an owner alone means all its repositories)",
+    )
+    parser.add_argument(
+        "--exclude",
+        metavar="PATTERNS",
+        default=DISCOVER_EXCLUDE,
+        help="never discover these owner/name patterns",
+    )
+
+    cassettes = parser.add_mutually_exclusive_group()
+    cassettes.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="save every API exchange of the run to CASSETTE",
+    )
+    cassettes.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help="answer every API request from CASSETTE, offline",
+    )
+    parser.add_argument(
+        "--latency",
+        action="store_true",
+        help="with --replay, delay responses by their recorded latency",
+    )
+    args = parser.parse_args(argv)
+
+    if args.latency and not args.replay:
+        parser.error("--latency requires --replay")
+
+    logins = args.logins or [USER]
+    batch = logins != [USER]
+
+    discovery = {
+        "discover": args.discover,
+        "discover_include": args.include,
+        "discover_exclude": args.exclude,
+    }
+
+    # --check and --counts only query; they write nothing but a cassette.
+    query_only = args.check or args.counts
+
+    if TRACE_PATH and not query_only:
+        tracing.enable()
+
+    with contextlib.ExitStack() as stack:
+        options = {} if args.check else dict(discovery)
+
+        if args.record or args.replay:
+            try:
+                options |= cassette_options(
+                    args,
+                    stack.enter_context(
+                        tempfile.TemporaryDirectory(prefix="metrics-")
+                    ),
+                )
+            except (OSError, ValueError) as exc:
+                parser.error(f"cannot read cassette: {exc}")
+
+        collector = stack.enter_context(MetricsCollector(**options))
+
+        if query_only:
+            if args.check:
+                check(collector, logins)
+            else:
+                print_commit_counts(collector, logins)
+
+            if args.record:
+                save_cassette(collector, args.record)
+
+            return
+
+        run(collector, logins, batch, args)
+
+    if TRACE_PATH:
+        tracing.export_chrome(TRACE_PATH)
+
+        print()
+        print(f"Trace (written to {TRACE_PATH}):")
+
+        for line in tracing.summary_lines():
+            print(f"  {line}")
+
+
+def run(collector, logins, batch, args):
+    previous_series = {
+        login: load_series(series_path(login, batch))
+        for login in logins
+    }
+
+    started = time.perf_counter()
+
+    with tracing.span("collect", users=len(logins)):
+        results = collector._collect(logins, previous_series)
+
+    elapsed = time.perf_counter() - started
+
+    with tracing.span("write metrics"):
+        for login, (metrics, tally, series) in results.items():
+            path = metrics_path(login, batch)
+            written = write_metrics(metrics, path)
+            series.save(series_path(login, batch))
+            print_summary(path, metrics, tally, series, written)
+
+    if args.replay:
+        # A replay is not a new observation, and its request timings
+        # would only describe the cassette.
+        print()
+        print(
+            f"Replayed {len(collector.replay)} exchanges from "
+            f"{args.replay} (recorded {collector.replay.recorded_at}) "
+            f"in {elapsed:.2f}s"
         )
-    ),
-}
+        return
+
+    with tracing.span("record history"), MetricsStore(METRICS_DB) as store:
+        for metrics, tally, _ in results.values():
+            store.record(metrics, tally["repositories"])
+
+        compacted = store.compact()
+
+    print()
+    print(
+        f"History store:      {len(results)} run(s) appended to "
+        f"{METRICS_DB}, {compacted} old run(s) compacted"
+    )
+
+    if args.record:
+        save_cassette(collector, args.record)
 
+    cache = collector.response_cache
 
-# Write metrics.json
+    print()
+    print(
+        f"Response cache:     {cache.hits} hits, "
+        f"{cache.misses} stored, "
+        f"{cache.size():,} bytes"
+    )
+
+    print()
+    print("Rate limits:")
+
+    for line in collector.rate_limiter.summary():
+        print(f"  {line}")
+
+    if collector.history.pages:
+        print(f"  history  {collector.history.summary()}")
 
-with open("metrics.json", "w", encoding="utf-8") as f:
-    json.dump(metrics, f, indent=2)
+    timing_path = os.path.join(
+        os.path.dirname(metrics_path(logins[0], batch)),
+        TIMING_FILENAME,
+    )
+    collector.transport_stats.write(timing_path)
+
+    print()
+    print(
+        f"Request timing ({collector.transport_stats.connections} "
+        f"connections opened, written to {timing_path}):"
+    )
 
-# Output summary
+    for line in collector.transport_stats.lines():
+        print(f"  {line}")
 
-print()
-print("=" * 50)
-print("metrics.json updated")
-print("=" * 50)
-print(f"Repositories:       {metrics['repos']}")
-print(f"Stars:              {metrics['stars']}")
-print(f"Forks:              {metrics['forks']}")
-print(f"GitHub commits:     {metrics['commits']}")
-print(f"Contributor commits:{contributor_commits}")
-print(f"LOC added:          {metrics['loc_added']:,}")
-print(f"LOC removed:        {metrics['loc_removed']:,}")
-print(f"Followers:          {metrics['followers']}")
-print(f"Following:          {metrics['following']}")
-print("=" * 50)
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 import json
+import os
 from datetime import date
 from calendar import monthrange
 
+import svgterm
+from manifest import source_digest, stable_metrics, write_if_changed
+from svgterm import COMPACT, Columns, Document, Panel, emit, style
+
 # USER CONFIG
 GITHUB_USERNAME = "ShavirV"
 FULL_NAME = "Shavir Vallabh"
@@ -40,6 +45,31 @@ COLOR_USER      = "#bb9af7"
 COLOR_REDDISH   = "#e30e0e"
 COLOR_GREENISH  = "#0ee355"
 
+# Static ASCII art of the left block; its lines are rendered once per
+# process and served from the svgterm cache afterwards.
+LOGO = [
+    [("    :-::::.........................          ", COLOR_ASCII)],
+    [("  :--:::.............................        ", COLOR_ASCII)],
+    [(" :-::::................................      ", COLOR_ASCII)],
+    [(" -::::.............................+-..      ", COLOR_ASCII)],
+    [(".::::.............................==+=..     ", COLOR_ASCII)],
+    [(".:::...............................*#+..     ", COLOR_ASCII)],
+    [(".:::.........++*+:.......................    ", COLOR_ASCII)],
+    [(".::.........=*+.*+.......................    ", COLOR_ASCII)],
+    [(".::..........=**+........................    ", COLOR_ASCII)],
+    [(".::........................:----::::.....    ", COLOR_ASCII)],
+    [(".::.....................:============:..     ", COLOR_ASCII)],
+    [(" ::.................:-================..     ", COLOR_ASCII)],
+    [(" .::...............-=============--=-..:----:", COLOR_ASCII)],
+    [("   .:..............:========------:...::::::-", COLOR_ASCII)],
+    [("     ................:--------::........:::::", COLOR_ASCII)],
+    [("       .....................................:", COLOR_ASCII)],
+    [("        :....................................", COLOR_ASCII)],
+    [("      .:::.................................. ", COLOR_ASCII)],
+    [("    .:...................................    ", COLOR_ASCII)],
+    [("           .......................           ", COLOR_ASCII)],
+]
+
 # HELPERS
 def calculate_age(birthdate: date) -> str:
     today = date.today()
@@ -62,22 +92,6 @@ def load_metrics(path="metrics.json") -> dict:
         return json.load(f)
 
 
-def escape(text: str) -> str:
-    return (
-        text.replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-    )
-
-
-def svg_line(x: int, y: int, spans: list) -> str:
-    tspans = "".join(
-        f'<tspan fill="{color}">{escape(text)}</tspan>'
-        for text, color in spans
-    )
-    return f'<text x="{x}" y="{y}">{tspans}</text>'
-
-
 def safe_get(obj, *keys, default=0):
     for key in keys:
         obj = obj.get(key, {})
@@ -106,26 +120,7 @@ def generate_svg(metrics: dict) -> str:
 
         [],
 
-        [("    :-::::.........................          ", COLOR_ASCII)],
-        [("  :--:::.............................        ", COLOR_ASCII)],
-        [(" :-::::................................      ", COLOR_ASCII)],
-        [(" -::::.............................+-..      ", COLOR_ASCII)],
-        [(".::::.............................==+=..     ", COLOR_ASCII)],
-        [(".:::...............................*#+..     ", COLOR_ASCII)],
-        [(".:::.........++*+:.......................    ", COLOR_ASCII)],
-        [(".::.........=*+.*+.......................    ", COLOR_ASCII)],
-        [(".::..........=**+........................    ", COLOR_ASCII)],
-        [(".::........................:----::::.....    ", COLOR_ASCII)],
-        [(".::.....................:============:..     ", COLOR_ASCII)],
-        [(" ::.................:-================..     ", COLOR_ASCII)],
-        [(" .::...............-=============--=-..:----:", COLOR_ASCII)],
-        [("   .:..............:========------:...::::::-", COLOR_ASCII)],
-        [("     ................:--------::........:::::", COLOR_ASCII)],
-        [("       .....................................:", COLOR_ASCII)],
-        [("        :....................................", COLOR_ASCII)],
-        [("      .:::.................................. ", COLOR_ASCII)],
-        [("    .:...................................    ", COLOR_ASCII)],
-        [("           .......................           ", COLOR_ASCII)],
+        *LOGO,
 
         [],
         [],
@@ -175,45 +170,43 @@ def generate_svg(metrics: dict) -> str:
     ]
 
     # SVG BUILD
-    lines = max(len(left), len(right))
-    height = PADDING * 4 + lines * LINE_HEIGHT + 5
-
-    svg = [
-        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{height}">',
-        f'<rect width="100%" height="100%" fill="{BG_COLOR}"/>',
-        f'''
-        <style>
-            text {{
-                font-family: {FONT_FAMILY};
-                font-size: {FONT_SIZE}px;
-                white-space: pre;
-                dominant-baseline: text-before-edge;
-                letter-spacing: 0.3px;
-            }}
-        </style>
-        '''
-    ]
+    columns = Columns(
+        Panel(PADDING, PADDING, LINE_HEIGHT, left),
+        Panel(RIGHT_X, PADDING, LINE_HEIGHT, right),
+    )
+    height = PADDING * 4 + len(columns) * LINE_HEIGHT + 5
 
-    y = PADDING
-    for i in range(lines):
-        if i < len(left) and left[i]:
-            svg.append(svg_line(PADDING, y, left[i]))
-        if i < len(right) and right[i]:
-            svg.append(svg_line(RIGHT_X, y, right[i]))
-        y += LINE_HEIGHT
+    svg = Document(
+        SVG_WIDTH, height, BG_COLOR,
+        style(FONT_FAMILY, FONT_SIZE, 0.3),
+    )
+    svg.add(columns)
 
-    svg.append("</svg>")
-    return "\n".join(svg)
+    return svg.render()
 
 # MAIN
+def inputs(metrics: dict) -> dict:
+    """Everything neofetch.svg depends on; config lives in the code."""
+
+    return {
+        "metrics": stable_metrics(metrics),
+        "age": calculate_age(BIRTHDATE),
+        "code": source_digest(__file__, os.path.dirname(svgterm.__file__)),
+        "compact": COMPACT,
+    }
+
+
 def main():
     metrics = load_metrics()
-    svg = generate_svg(metrics)
-
-    with open("neofetch.svg", "w", encoding="utf-8") as f:
-        f.write(svg)
 
-    print("neofetch.svg generated successfully")
+    if write_if_changed(
+        "neofetch.svg",
+        inputs(metrics),
+        lambda: emit("neofetch.svg", generate_svg(metrics)),
+    ):
+        print("neofetch.svg generated successfully")
+    else:
+        print("neofetch.svg unchanged, skipped")
 
 if __name__ == "__main__":
     main()
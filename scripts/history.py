@@ -0,0 +1,399 @@
+"""
+history.py
+
+Commit-history fallback for repositories too large for contributor
+statistics.
+
+GitHub answers /stats/contributors with HTTP 422 for repositories with
+10,000+ commits, so they would add nothing to the LOC totals.
+HistoryWalker computes the same figures from the default branch through
+GraphQL instead: history(author: {id: ...}) lists only the user's
+commits, each with its additions and deletions.
+
+- GraphQL cursors are opaque and cannot be split, so the history is
+  divided into date ranges (since/until) and every range is paged by
+  its own worker.
+- Each page is charged against a cost budget shared by the whole run.
+  Once it is spent, the walk stops and the repository is reported as
+  incomplete with BudgetExhausted.
+- A page answered with GraphQL errors (large histories tend to time
+  out on GitHub's side) stops the walk the same way, with
+  HistoryIncomplete; the range keeps its cursor, so that page is
+  retried next run.
+- Progress (per range: cursor plus the weekly figures read so far) is
+  checkpointed to a JSON file after every page, so the next run resumes
+  where this one stopped. Finished walks are kept, and later runs only
+  walk the commits made since.
+
+Rewritten (force-pushed) history is not detected; delete the checkpoint
+entry to walk a repository again from scratch.
+"""
+
+import json
+import os
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import tracing
+from rate_limit import RATE_LIMIT_FIELDS
+from timeseries import week_start
+
+
+# Commits requested per page (GitHub's maximum is 100).
+PAGE_SIZE = 100
+
+DEFAULT_WORKERS = 4
+
+# GraphQL points the fallback may spend per run. A page of 100 commits
+# costs about one point.
+DEFAULT_COST_BUDGET = 1000
+
+CREATED_QUERY = """
+query($owner: String!, $name: String!) {
+%s
+  repository(owner: $owner, name: $name) {
+    createdAt
+  }
+}
+""" % RATE_LIMIT_FIELDS
+
+HISTORY_QUERY = """
+query(
+  $owner: String!
+  $name: String!
+  $author: ID!
+  $pageSize: Int!
+  $since: GitTimestamp
+  $until: GitTimestamp
+  $cursor: String
+) {
+%s
+  repository(owner: $owner, name: $name) {
+    defaultBranchRef {
+      target {
+        ... on Commit {
+          history(
+            first: $pageSize
+            after: $cursor
+            author: { id: $author }
+            since: $since
+            until: $until
+          ) {
+            pageInfo {
+              hasNextPage
+              endCursor
+            }
+
+            nodes {
+              committedDate
+              additions
+              deletions
+            }
+          }
+        }
+      }
+    }
+  }
+}
+""" % RATE_LIMIT_FIELDS
+
+
+class HistoryIncomplete(Exception):
+    """A repository's history walk stopped early; the next run resumes."""
+
+
+class BudgetExhausted(HistoryIncomplete):
+    """The cost budget ran out before a repository's history was walked."""
+
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def format_timestamp(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def split_ranges(start, end, count):
+    """
+    Divide [start, end] into count ranges of equal length.
+
+    The first range has no lower bound, so commits dated before start
+    (e.g. imported history) are included. Bounds are inclusive, hence
+    the one-second gaps.
+    """
+
+    step = (end - start) / count
+    ranges = []
+
+    for i in range(count):
+        since = None if i == 0 else start + step * i
+        until = end if i == count - 1 else start + step * (i + 1)
+
+        if i < count - 1:
+            until -= timedelta(seconds=1)
+
+        ranges.append(new_range(since, until))
+
+    return ranges
+
+
+def new_range(since, until):
+    return {
+        "since": since and format_timestamp(since),
+        "until": format_timestamp(until),
+        "cursor": None,
+        "done": False,
+
+        # "week timestamp" -> [additions, deletions, commits]
+        "weeks": {},
+    }
+
+
+def merge_weeks(ranges):
+    weeks = {}
+
+    for commit_range in ranges:
+        for week, figures in commit_range["weeks"].items():
+            totals = weeks.setdefault(week, [0, 0, 0])
+
+            for i, value in enumerate(figures):
+                totals[i] += value
+
+    return weeks
+
+
+class HistoryWalker:
+    """Sums a user's commits from a repository's GraphQL history."""
+
+    def __init__(
+        self,
+        graphql,
+        checkpoint_path,
+        workers=DEFAULT_WORKERS,
+        cost_budget=DEFAULT_COST_BUDGET,
+    ):
+        # graphql(query, variables) -> data, e.g. MetricsCollector.graphql
+        self.graphql = graphql
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.cost_budget = cost_budget
+
+        self.cost = 0
+        self.pages = 0
+
+        self._lock = threading.Lock()
+        self._checkpoint = None
+
+    # Checkpoint
+
+    def _entries(self):
+        if self._checkpoint is None:
+            try:
+                with open(self.checkpoint_path, encoding="utf-8") as f:
+                    self._checkpoint = json.load(f)
+            except (OSError, ValueError):
+                self._checkpoint = {}
+
+        return self._checkpoint
+
+    def _save(self):
+        """Write the checkpoint; the caller holds self._lock."""
+
+        directory = os.path.dirname(self.checkpoint_path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temporary = f"{self.checkpoint_path}.tmp"
+
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self._entries(), f, separators=(",", ":"))
+
+        os.replace(temporary, self.checkpoint_path)
+
+    # Walking
+
+    def _query(self, query, variables):
+        """Run a query if the budget allows, otherwise return None."""
+
+        # Reserve one point up front so concurrent ranges cannot overrun
+        # the budget, then settle with the reported cost.
+        with self._lock:
+            if self.cost >= self.cost_budget:
+                return None
+
+            self.cost += 1
+
+        try:
+            data = self.graphql(query, variables)
+        except Exception as exc:
+            with self._lock:
+                self.cost -= 1
+
+            # graphql() raises RuntimeError for responses with errors,
+            # e.g. a history page that timed out on GitHub's side.
+            if isinstance(exc, RuntimeError):
+                raise HistoryIncomplete(
+                    f"{variables['owner']}/{variables['name']}: history "
+                    f"query failed, resuming next run: {exc}"
+                ) from exc
+
+            raise
+
+        with self._lock:
+            self.cost += ((data.get("rateLimit") or {}).get("cost") or 1) - 1
+            self.pages += 1
+
+        return data
+
+    def _plan(self, owner, name, author_id, now):
+        """Return the checkpoint entry, with ranges covering up to now."""
+
+        key = f"{owner}/{name}"
+
+        with self._lock:
+            entry = self._entries().get(key)
+
+        if entry is not None and entry["author"] != author_id:
+            entry = None
+
+        if entry is None:
+            data = self._query(CREATED_QUERY, {"owner": owner, "name": name})
+
+            if data is None:
+                raise BudgetExhausted(
+                    f"{key}: history cost budget of {self.cost_budget} "
+                    f"used up; resuming next run"
+                )
+
+            created = parse_timestamp(data["repository"]["createdAt"])
+
+            entry = {
+                "author": author_id,
+                "ranges": split_ranges(created, now, self.workers),
+            }
+
+        elif all(commit_range["done"] for commit_range in entry["ranges"]):
+            # Only the commits since the last finished walk are new.
+            walked = parse_timestamp(entry["ranges"][-1]["until"])
+
+            if walked < now:
+                entry["ranges"] = [
+                    {
+                        "since": None,
+                        "until": entry["ranges"][-1]["until"],
+                        "cursor": None,
+                        "done": True,
+                        "weeks": merge_weeks(entry["ranges"]),
+                    },
+                    new_range(walked + timedelta(seconds=1), now),
+                ]
+
+        with self._lock:
+            self._entries()[key] = entry
+            self._save()
+
+        return entry
+
+    def _walk_range(self, owner, name, author_id, commit_range):
+        while not commit_range["done"]:
+            data = self._query(
+                HISTORY_QUERY,
+                {
+                    "owner": owner,
+                    "name": name,
+                    "author": author_id,
+                    "pageSize": PAGE_SIZE,
+                    "since": commit_range["since"],
+                    "until": commit_range["until"],
+                    "cursor": commit_range["cursor"],
+                },
+            )
+
+            if data is None:
+                return
+
+            branch = (data.get("repository") or {}).get("defaultBranchRef")
+
+            with self._lock:
+                # An empty repository has no default branch.
+                if not branch:
+                    commit_range["done"] = True
+                    self._save()
+                    return
+
+                history = branch["target"]["history"]
+
+                for commit in history["nodes"]:
+                    committed = parse_timestamp(commit["committedDate"])
+                    week = str(week_start(committed.timestamp()))
+                    figures = commit_range["weeks"].setdefault(week, [0, 0, 0])
+                    figures[0] += commit["additions"]
+                    figures[1] += commit["deletions"]
+                    figures[2] += 1
+
+                commit_range["cursor"] = history["pageInfo"]["endCursor"]
+                commit_range["done"] = not history["pageInfo"]["hasNextPage"]
+
+                self._save()
+
+    def walk(self, owner, name, author_id):
+        """
+        Return (additions, deletions, commits, weeks) for the author's
+        commits on the default branch, in the same shape as the contributor
+        statistics. Raises HistoryIncomplete (BudgetExhausted when the
+        budget ran out) if the walk could not finish; the next call
+        resumes from the checkpoint.
+        """
+
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+
+        with tracing.span("history walk", repo=f"{owner}/{name}"):
+            entry = self._plan(owner, name, author_id, now)
+
+            pending = [
+                commit_range for commit_range in entry["ranges"]
+                if not commit_range["done"]
+            ]
+
+            if pending:
+                with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                    for future in [
+                        executor.submit(
+                            self._walk_range, owner, name, author_id,
+                            commit_range,
+                        )
+                        for commit_range in pending
+                    ]:
+                        future.result()
+
+        if not all(commit_range["done"] for commit_range in entry["ranges"]):
+            raise BudgetExhausted(
+                f"{owner}/{name}: history cost budget of "
+                f"{self.cost_budget} used up; resuming next run"
+            )
+
+        weeks = merge_weeks(entry["ranges"])
+        order = sorted(weeks, key=int)
+
+        columns = (
+            array("q", map(int, order)),
+            array("q", (weeks[week][0] for week in order)),
+            array("q", (weeks[week][1] for week in order)),
+            array("q", (weeks[week][2] for week in order)),
+        )
+
+        return (
+            sum(columns[1]),
+            sum(columns[2]),
+            sum(columns[3]),
+            columns,
+        )
+
+    def summary(self):
+        return (
+            f"{self.pages} pages, cost {self.cost}/{self.cost_budget}"
+        )
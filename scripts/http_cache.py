@@ -0,0 +1,308 @@
+"""
+http_cache.py
+
+Persistent conditional-request cache for the GitHub REST API.
+
+Responses that carry an ETag or Last-Modified header are written to disk,
+keyed by URL. The next request for the same URL sends If-None-Match /
+If-Modified-Since, and when GitHub answers 304 Not Modified the stored
+body is served instead. 304 responses do not count against the REST rate
+limit, so unchanged repositories cost nothing on the daily run.
+
+The cache plugs into a requests.Session as a transport adapter:
+
+    cache = ResponseCache(".cache/github")
+    session.mount("https://", CachingAdapter(cache))
+
+Bodies are streamed to and from disk, so a cached response never has to
+be held in memory as a whole. The directory is bounded in size; the least
+recently used entries are evicted first.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+# Default upper bound for the cache directory.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Chunk size used when streaming bodies to disk.
+CHUNK_SIZE = 64 * 1024
+
+# Headers that describe the transfer rather than the content. Bodies are
+# stored decoded, so these would be wrong when the entry is served again.
+TRANSFER_HEADERS = (
+    "content-encoding",
+    "content-length",
+    "transfer-encoding",
+)
+
+
+class _CachedBody(io.FileIO):
+    """File-backed response body that closes itself once fully read."""
+
+    def read(self, size=-1):
+        data = super().read(size)
+
+        if not data:
+            self.close()
+
+        return data
+
+
+class ResponseCache:
+    """Size-bounded on-disk store of response bodies and validators."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+        # key -> (size in bytes, last used timestamp)
+        self._index = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # Paths
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, key + ".body")
+
+    def _load_index(self):
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+
+            key = filename[: -len(".json")]
+
+            try:
+                size = os.path.getsize(self._body_path(key))
+                used = os.path.getmtime(self._meta_path(key))
+            except OSError:
+                self._remove(key)
+                continue
+
+            self._index[key] = (size, used)
+
+    # Lookup
+
+    def lookup(self, url):
+        """Return the stored metadata for a URL, or None."""
+
+        key = self.key(url)
+
+        with self._lock:
+            if key not in self._index:
+                return None
+
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._remove(key)
+            return None
+
+        if meta.get("url") != url:
+            return None
+
+        return meta
+
+    def conditional_headers(self, meta):
+        headers = {}
+
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        return headers
+
+    def open_body(self, url):
+        """Open the stored body for a URL, marking it as recently used."""
+
+        key = self.key(url)
+        body = _CachedBody(self._body_path(key), "r")
+
+        now = time.time()
+
+        with self._lock:
+            self.hits += 1
+
+            if key in self._index:
+                self._index[key] = (self._index[key][0], now)
+
+        try:
+            os.utime(self._meta_path(key), (now, now))
+        except OSError:
+            pass
+
+        return body
+
+    # Storage
+
+    def store(self, url, response):
+        """
+        Stream a 200 response body to disk.
+
+        Returns a file object positioned at the start of the stored body,
+        which replaces the (now consumed) network stream on the response.
+        """
+
+        key = self.key(url)
+        body_path = self._body_path(key)
+        meta_path = self._meta_path(key)
+
+        # Write to temporary files first so concurrent readers never see
+        # a partially written entry.
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+
+        size = 0
+
+        with open(body_path + suffix, "wb") as f:
+            for chunk in response.raw.stream(CHUNK_SIZE, decode_content=True):
+                f.write(chunk)
+                size += len(chunk)
+
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() not in TRANSFER_HEADERS
+        }
+
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "headers": headers,
+            "size": size,
+        }
+
+        with open(meta_path + suffix, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        with self._lock:
+            os.replace(body_path + suffix, body_path)
+            os.replace(meta_path + suffix, meta_path)
+
+            self.misses += 1
+            self._index[key] = (size, time.time())
+            self._evict()
+
+        return _CachedBody(body_path, "r")
+
+    # Eviction
+
+    def size(self):
+        with self._lock:
+            return sum(size for size, _ in self._index.values())
+
+    def _evict(self):
+        total = sum(size for size, _ in self._index.values())
+
+        if total <= self.max_bytes:
+            return
+
+        by_age = sorted(self._index.items(), key=lambda item: item[1][1])
+
+        for key, (size, _) in by_age:
+            if total <= self.max_bytes:
+                break
+
+            self._remove(key)
+            total -= size
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+
+        for path in (self._meta_path(key), self._body_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class CachingAdapter(HTTPAdapter):
+    """HTTPAdapter that revalidates GET requests against a ResponseCache."""
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != "GET":
+            return super().send(request, **kwargs)
+
+        meta = self.cache.lookup(request.url)
+
+        if meta:
+            request.headers.update(self.cache.conditional_headers(meta))
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and meta:
+            return self._serve_cached(request, response, meta)
+
+        validated = (
+            response.headers.get("ETag")
+            or response.headers.get("Last-Modified")
+        )
+
+        if response.status_code == 200 and validated:
+            response.raw = self.cache.store(request.url, response)
+
+            for name in TRANSFER_HEADERS:
+                response.headers.pop(name, None)
+
+        return response
+
+    def _serve_cached(self, request, not_modified, meta):
+        """Build a 200 response from the cache for a 304 answer."""
+
+        headers = CaseInsensitiveDict(meta["headers"])
+
+        # Keep fresh rate-limit and date headers from the 304 itself.
+        for name, value in not_modified.headers.items():
+            if name.lower() not in TRANSFER_HEADERS:
+                headers[name] = value
+
+        # The 304 has no body; read it so the connection returns to the
+        # pool.
+        not_modified.content
+        not_modified.close()
+
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = headers
+        response.raw = self.cache.open_body(request.url)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = not_modified.elapsed
+        response.encoding = get_encoding_from_headers(headers)
+        response.from_cache = True
+
+        return response
@@ -0,0 +1,146 @@
+"""
+manifest.py
+
+Content-addressed skipping of generated files.
+
+Each generator describes the inputs its output is a pure function of:
+the metrics it shows (minus volatile fields such as generated_at),
+values derived from the date (age, daily scramble) and its own code,
+which includes its configuration constants. The digest of those inputs
+is kept per output in a small manifest; when it matches on the next run
+and the file is still there, rendering and writing are skipped:
+
+    written = write_if_changed(
+        "neofetch.svg",
+        {"metrics": metrics, "age": age, "code": source_digest(__file__)},
+        lambda: generate_svg(metrics),
+    )
+
+An unchanged day then costs no rendering, no disk writes and, as the
+files stay byte-identical, no git commit. Set FORCE_RENDER=1 to write
+every output regardless.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+MANIFEST_PATH = os.getenv("OUTPUT_MANIFEST", ".cache/outputs.json")
+
+FORCE = os.getenv("FORCE_RENDER", "") == "1"
+
+# Fields of metrics.json that change on every run without changing what
+# any output shows.
+VOLATILE_FIELDS = ("generated_at",)
+
+_lock = threading.Lock()
+
+
+def digest(inputs):
+    """SHA-256 of inputs serialised as canonical JSON."""
+
+    encoded = json.dumps(
+        inputs, sort_keys=True, separators=(",", ":"), default=str
+    ).encode("utf-8")
+
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def stable_metrics(metrics):
+    return {
+        key: value for key, value in metrics.items()
+        if key not in VOLATILE_FIELDS
+    }
+
+
+def source_digest(*paths):
+    """
+    Digest of source files; a directory stands for the .py files in it.
+
+    Read on every call, so a long-running process sees edits.
+    """
+
+    sha = hashlib.sha256()
+
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.endswith(".py")
+            )
+        else:
+            files = [path]
+
+        for name in files:
+            with open(name, "rb") as f:
+                sha.update(os.path.basename(name).encode("utf-8"))
+                sha.update(b"\0")
+                sha.update(f.read())
+
+    return sha.hexdigest()
+
+
+class Manifest:
+    """Output path -> digest of the inputs it was last written from."""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def unchanged(self, output, key):
+        if FORCE or not os.path.exists(output):
+            return False
+
+        return self._load().get(os.path.normpath(output)) == key
+
+    def record(self, output, key):
+        # Generators may run in parallel in one process, so every update
+        # re-reads the file under a lock instead of keeping a copy.
+        with _lock:
+            entries = self._load()
+            entries[os.path.normpath(output)] = key
+
+            directory = os.path.dirname(self.path)
+
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            temporary = f"{self.path}.tmp"
+
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=1, sort_keys=True)
+
+            os.replace(temporary, self.path)
+
+
+def write_if_changed(output, inputs, render, manifest=None):
+    """
+    Write render() to output unless inputs are unchanged since the last
+    write. Returns whether the file was written.
+    """
+
+    manifest = manifest or Manifest()
+    key = digest(inputs)
+
+    if manifest.unchanged(output, key):
+        return False
+
+    content = render()
+
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(content)
+
+    manifest.record(output, key)
+    return True
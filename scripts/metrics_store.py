@@ -0,0 +1,519 @@
+"""
+metrics_store.py
+
+Append-only SQLite history of every metrics run.
+
+fetch_metrics.py overwrites metrics.json on each run; MetricsStore keeps
+every run instead, one row per run in `runs` plus one row per repository
+in `repositories`, indexed by user, day and repository. Questions such
+as "stars gained this month" or "LOC per week" are then answered from
+the local file in milliseconds, without GitHub or git history.
+
+Rows are appended as "daily" rows. compact() downsamples daily rows
+older than a retention window to one "weekly" row per user and week
+(the last run of the week, since the figures are running totals).
+Weeks are GitHub's statistics weeks, Sunday to Saturday in UTC, as in
+metrics_weekly.bin.
+
+commits is the lifetime commit count and commits_last_year the rolling
+one-year count. Stores written before lifetime counting are migrated on
+open: their commits figures were one-year counts and move over, leaving
+commits empty for those runs. Queries skip runs without the figure.
+
+Usage:
+    python scripts/metrics_store.py summary
+    python scripts/metrics_store.py delta stars --since month
+    python scripts/metrics_store.py delta followers --since 2026-01-01
+    python scripts/metrics_store.py weekly loc_added --weeks 12
+    python scripts/metrics_store.py repos stars --since 30d
+    python scripts/metrics_store.py compact --keep-days 90
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from timeseries import week_start
+
+
+DEFAULT_PATH = ".cache/metrics.sqlite"
+
+# Daily rows older than this are downsampled to weekly rows.
+DEFAULT_KEEP_DAYS = 90
+
+# Columns of `runs` that queries may name.
+RUN_FIELDS = (
+    "repos",
+    "stars",
+    "forks",
+    "commits",
+    "commits_last_year",
+    "loc_added",
+    "loc_removed",
+    "followers",
+    "following",
+)
+
+# Columns of `repositories` that queries may name.
+REPO_FIELDS = ("stars", "forks", "additions", "deletions", "commits")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id                INTEGER PRIMARY KEY,
+    user              TEXT NOT NULL,
+    recorded_at       TEXT NOT NULL,
+    day               TEXT NOT NULL,
+    granularity       TEXT NOT NULL DEFAULT 'daily',
+    repos             INTEGER,
+    stars             INTEGER,
+    forks             INTEGER,
+    commits           INTEGER,
+    commits_last_year INTEGER,
+    loc_added         INTEGER,
+    loc_removed       INTEGER,
+    followers         INTEGER,
+    following         INTEGER,
+    top_languages     TEXT
+);
+
+CREATE INDEX IF NOT EXISTS runs_user_day ON runs (user, day);
+
+CREATE TABLE IF NOT EXISTS repositories (
+    run_id    INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    user      TEXT NOT NULL,
+    repo      TEXT NOT NULL,
+    day       TEXT NOT NULL,
+    language  TEXT,
+    stars     INTEGER,
+    forks     INTEGER,
+    additions INTEGER,
+    deletions INTEGER,
+    commits   INTEGER,
+    pushed_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS repositories_run ON repositories (run_id);
+CREATE INDEX IF NOT EXISTS repositories_user_day
+    ON repositories (user, day);
+CREATE INDEX IF NOT EXISTS repositories_repo_day
+    ON repositories (repo, day);
+"""
+
+# SQL for the statistics week (the Sunday starting it) of a day column,
+# matching week_of().
+WEEK_OF_DAY = "date(day, '-6 days', 'weekday 0')"
+
+
+def _check_field(field, allowed):
+    # Column names cannot be bound as parameters.
+    if field not in allowed:
+        raise ValueError(
+            f"unknown field {field!r}; expected one of {', '.join(allowed)}"
+        )
+
+
+def week_of(day):
+    """Sunday starting the statistics week of a date."""
+
+    midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    start = week_start(midnight.timestamp())
+
+    return datetime.fromtimestamp(start, timezone.utc).date()
+
+
+class MetricsStore:
+    """Append-only store of metrics runs in one SQLite file."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self._migrate()
+        self.db.executescript(SCHEMA)
+
+    def _migrate(self):
+        """Bring a store written by an older version up to SCHEMA."""
+
+        columns = {
+            row["name"] for row in self.db.execute("PRAGMA table_info(runs)")
+        }
+
+        if columns and "commits_last_year" not in columns:
+            # Until lifetime counting, commits held the one-year count;
+            # the lifetime count of those runs is unknown.
+            with self.db:
+                self.db.execute(
+                    "ALTER TABLE runs ADD COLUMN commits_last_year INTEGER"
+                )
+                self.db.execute(
+                    "UPDATE runs SET commits_last_year = commits, "
+                    "commits = NULL"
+                )
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Writing
+
+    def record(self, metrics, repositories=None):
+        """
+        Append one run.
+
+        metrics is a metrics.json document; repositories optionally maps
+        repository names to their figures (the tally's "repositories").
+        Returns the run ID.
+        """
+
+        recorded_at = metrics["generated_at"]
+        day = recorded_at[:10]
+        user = metrics["user"]
+
+        with self.db:
+            cursor = self.db.execute(
+                f"INSERT INTO runs (user, recorded_at, day, "
+                f"{', '.join(RUN_FIELDS)}, top_languages) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(RUN_FIELDS))}, ?)",
+                (
+                    user,
+                    recorded_at,
+                    day,
+                    *(metrics.get(field) for field in RUN_FIELDS),
+                    json.dumps(metrics.get("top_languages", {})),
+                ),
+            )
+            run_id = cursor.lastrowid
+
+            self.db.executemany(
+                "INSERT INTO repositories (run_id, user, repo, day, "
+                "language, stars, forks, additions, deletions, commits, "
+                "pushed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        run_id,
+                        user,
+                        name,
+                        day,
+                        repo.get("language"),
+                        repo.get("stars"),
+                        repo.get("forks"),
+                        repo.get("additions"),
+                        repo.get("deletions"),
+                        repo.get("commits"),
+                        repo.get("pushed_at"),
+                    )
+                    for name, repo in sorted((repositories or {}).items())
+                ],
+            )
+
+        return run_id
+
+    def compact(self, keep_days=DEFAULT_KEEP_DAYS, today=None):
+        """
+        Downsample daily rows older than keep_days to one weekly row per
+        user and week. Returns the number of runs removed.
+
+        The cut-off is moved back to a week boundary, so a week is never
+        split between daily and weekly rows.
+        """
+
+        today = today or datetime.now(timezone.utc).date()
+        cutoff = week_of(today - timedelta(days=keep_days)).isoformat()
+
+        with self.db:
+            removed = self.db.execute(
+                f"""
+                DELETE FROM runs
+                WHERE granularity = 'daily' AND day < :cutoff
+                  AND id NOT IN (
+                    SELECT id FROM (
+                      SELECT id, MAX(recorded_at)
+                      FROM runs
+                      WHERE granularity = 'daily' AND day < :cutoff
+                      GROUP BY user, {WEEK_OF_DAY}
+                    )
+                  )
+                """,
+                {"cutoff": cutoff},
+            ).rowcount
+
+            self.db.execute(
+                "UPDATE runs SET granularity = 'weekly' "
+                "WHERE granularity = 'daily' AND day < ?",
+                (cutoff,),
+            )
+
+        return removed
+
+    # Queries
+
+    def users(self):
+        return [
+            row[0] for row in self.db.execute(
+                "SELECT user FROM runs GROUP BY user "
+                "ORDER BY MAX(recorded_at) DESC"
+            )
+        ]
+
+    def latest(self, user):
+        """The most recent run of a user as a dict, or None."""
+
+        row = self.db.execute(
+            "SELECT * FROM runs WHERE user = ? "
+            "ORDER BY recorded_at DESC LIMIT 1",
+            (user,),
+        ).fetchone()
+
+        return dict(row) if row else None
+
+    def latest_with(self, user, field):
+        """The most recent run of a user that recorded field, or None."""
+
+        _check_field(field, RUN_FIELDS)
+
+        row = self.db.execute(
+            f"SELECT * FROM runs WHERE user = ? AND {field} IS NOT NULL "
+            f"ORDER BY recorded_at DESC LIMIT 1",
+            (user,),
+        ).fetchone()
+
+        return dict(row) if row else None
+
+    def run_at(self, user, day, field=None):
+        """
+        The last run on or before day, or the first run if there is none
+        that early (so a change "since" is counted from the first record).
+        With field, only runs that recorded it are considered.
+        """
+
+        recorded = ""
+
+        if field is not None:
+            _check_field(field, RUN_FIELDS)
+            recorded = f" AND {field} IS NOT NULL"
+
+        row = self.db.execute(
+            f"SELECT * FROM runs WHERE user = ? AND day <= ?{recorded} "
+            f"ORDER BY recorded_at DESC LIMIT 1",
+            (user, day),
+        ).fetchone()
+
+        if row is None:
+            row = self.db.execute(
+                f"SELECT * FROM runs WHERE user = ?{recorded} "
+                f"ORDER BY recorded_at LIMIT 1",
+                (user,),
+            ).fetchone()
+
+        return dict(row) if row else None
+
+    def delta(self, user, field, since):
+        """
+        Change of a field since a day (YYYY-MM-DD).
+
+        Returns (value then, value now, change), or None without runs
+        that recorded the field.
+        """
+
+        _check_field(field, RUN_FIELDS)
+
+        before = self.run_at(user, since, field)
+        after = self.latest_with(user, field)
+
+        if before is None:
+            return None
+
+        return before[field], after[field], after[field] - before[field]
+
+    def weekly(self, user, field, weeks=12):
+        """
+        [(week start, value, change from the previous week)] for the last
+        weeks weeks, using the last run of each week that recorded field.
+        """
+
+        _check_field(field, RUN_FIELDS)
+
+        rows = self.db.execute(
+            f"""
+            WITH weekly AS (
+              SELECT {WEEK_OF_DAY} AS week,
+                     {field} AS value,
+                     MAX(recorded_at)
+              FROM runs
+              WHERE user = ? AND {field} IS NOT NULL
+              GROUP BY week
+            )
+            SELECT week, value, value - LAG(value) OVER (ORDER BY week)
+            FROM weekly
+            ORDER BY week DESC
+            LIMIT ?
+            """,
+            (user, weeks),
+        ).fetchall()
+
+        return [tuple(row) for row in reversed(rows)]
+
+    def repo_deltas(self, user, field, since, top=10):
+        """
+        [(repo, value then, value now, change)] for the repositories whose
+        field changed most since a day. Repositories that are new since
+        then count from zero.
+        """
+
+        _check_field(field, REPO_FIELDS)
+
+        before = self.run_at(user, since)
+        after = self.latest(user)
+
+        if before is None:
+            return []
+
+        rows = self.db.execute(
+            f"""
+            SELECT latest.repo,
+                   COALESCE(base.{field}, 0),
+                   COALESCE(latest.{field}, 0),
+                   COALESCE(latest.{field}, 0) - COALESCE(base.{field}, 0)
+                     AS change
+            FROM repositories AS latest
+            LEFT JOIN repositories AS base
+              ON base.run_id = ? AND base.repo = latest.repo
+            WHERE latest.run_id = ?
+            ORDER BY change DESC, latest.repo
+            LIMIT ?
+            """,
+            (before["id"], after["id"], top),
+        ).fetchall()
+
+        return [tuple(row) for row in rows]
+
+
+# CLI
+
+def parse_since(value, today=None):
+    """YYYY-MM-DD, "month", "week" or a number of days such as "30d"."""
+
+    today = today or datetime.now(timezone.utc).date()
+
+    if value == "month":
+        return today.replace(day=1).isoformat()
+
+    if value == "week":
+        return week_of(today).isoformat()
+
+    if value.endswith("d") and value[:-1].isdigit():
+        return (today - timedelta(days=int(value[:-1]))).isoformat()
+
+    return date.fromisoformat(value).isoformat()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Query the metrics history store"
+    )
+    parser.add_argument(
+        "--db", default=os.getenv("METRICS_DB", DEFAULT_PATH)
+    )
+    parser.add_argument(
+        "--user", help="defaults to the most recently recorded user"
+    )
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("summary", help="latest figures of the user")
+
+    delta = commands.add_parser("delta", help="change of a figure")
+    delta.add_argument("field", choices=RUN_FIELDS)
+    delta.add_argument("--since", default="30d")
+
+    weekly = commands.add_parser("weekly", help="figure per week")
+    weekly.add_argument("field", choices=RUN_FIELDS)
+    weekly.add_argument("--weeks", type=int, default=12)
+
+    repos = commands.add_parser("repos", help="largest changes per repo")
+    repos.add_argument("field", choices=REPO_FIELDS)
+    repos.add_argument("--since", default="30d")
+    repos.add_argument("--top", type=int, default=10)
+
+    compact = commands.add_parser("compact", help="downsample old runs")
+    compact.add_argument("--keep-days", type=int, default=DEFAULT_KEEP_DAYS)
+
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        sys.exit(f"No metrics store at {args.db}")
+
+    started = time.perf_counter()
+
+    with MetricsStore(args.db) as store:
+        if args.command == "compact":
+            removed = store.compact(args.keep_days)
+            print(f"Compacted {removed} runs")
+            return
+
+        user = args.user or next(iter(store.users()), None)
+
+        if user is None:
+            sys.exit("The metrics store is empty")
+
+        if args.command == "summary":
+            latest = store.latest(user)
+
+            print(f"{user} at {latest['recorded_at']}")
+
+            for field in RUN_FIELDS:
+                value = latest[field]
+                value = "-" if value is None else f"{value:,}"
+                print(f"  {field:<17} {value:>12}")
+
+        elif args.command == "delta":
+            since = parse_since(args.since)
+            result = store.delta(user, args.field, since)
+
+            if result is None:
+                sys.exit(f"No {args.field} recorded for {user}")
+
+            before, after, change = result
+
+            print(
+                f"{user} {args.field} since {since}: "
+                f"{before:,} -> {after:,} ({change:+,})"
+            )
+
+        elif args.command == "weekly":
+            for week, value, change in store.weekly(
+                user, args.field, args.weeks
+            ):
+                change = "" if change is None else f"{change:+,}"
+                print(f"{week}  {value:>12,}  {change:>10}")
+
+        elif args.command == "repos":
+            since = parse_since(args.since)
+
+            for repo, before, after, change in store.repo_deltas(
+                user, args.field, since, args.top
+            ):
+                print(
+                    f"{repo:<40} {before:>10,} -> {after:>10,} "
+                    f"({change:+,})"
+                )
+
+    print(f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+preview.py
+
+Watch mode for build.py: re-render cards as their code or data changes
+and show them on a local page that reloads itself.
+
+    python scripts/build.py --watch
+    open http://127.0.0.1:8000/
+
+The generators stay imported. Files under scripts/ and the outputs of
+steps that are not re-run (metrics.json) are polled for changes; on a
+change only the affected modules are reloaded, in place, and only the
+affected cards re-rendered:
+
+- a generator's own file re-renders its card
+- svgterm/ or manifest.py is shared: every card is re-rendered
+- metrics.json re-renders the cards that need metrics
+
+The page holds a server-sent events connection and swaps in a card as
+soon as it has been written, so an edit shows up in a few tens of
+milliseconds. Metrics are never fetched in watch mode; replace
+metrics.json (or run build.py --only metrics) to preview new data.
+"""
+
+import html
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PREVIEW_PORT = int(os.getenv("PREVIEW_PORT", "8000"))
+
+# Seconds between polls of the watched files.
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "0.02"))
+
+# Modules every card imports, in the order they must be reloaded: a
+# module is reloaded after the modules it takes names from.
+SHARED_MODULES = (
+    "svgterm.fragments",
+    "svgterm.layout",
+    "svgterm.compact",
+    "svgterm",
+    "manifest",
+)
+
+PAGE = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>card preview</title>
+<style>
+  body {{ background: #1b2025; color: #d4d4d4; font-family: monospace; }}
+  figure {{ margin: 16px; }}
+  img {{ max-width: 100%; }}
+</style>
+</head>
+<body>
+{figures}
+<script>
+  new EventSource("/events").onmessage = (event) => {{
+    for (const name of JSON.parse(event.data)) {{
+      const card = document.getElementById(name);
+      if (card) card.src = name + "?" + Date.now();
+    }}
+  }};
+</script>
+</body>
+</html>
+"""
+
+FIGURE = (
+    '<figure><figcaption>{name}</figcaption>'
+    '<img id="{name}" src="{name}"></figure>'
+)
+
+
+def module_name(path):
+    """Dotted module name of a file under scripts/, or None."""
+
+    relative = os.path.relpath(path, SCRIPTS_DIR)
+
+    if relative.startswith(os.pardir) or not relative.endswith(".py"):
+        return None
+
+    parts = relative[:-len(".py")].split(os.sep)
+
+    if parts[-1] == "__init__":
+        parts.pop()
+
+    return ".".join(parts)
+
+
+def watched_files(data_files):
+    files = list(data_files)
+
+    for directory, _, names in os.walk(SCRIPTS_DIR):
+        if os.path.basename(directory) == "__pycache__":
+            continue
+
+        files.extend(
+            os.path.join(directory, name)
+            for name in names
+            if name.endswith(".py")
+        )
+
+    return files
+
+
+def snapshot(files):
+    """path -> mtime, for the files that exist."""
+
+    stamps = {}
+
+    for path in files:
+        try:
+            stamps[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+
+    return stamps
+
+
+class Reloads:
+    """Outputs written so far, for the page's event streams to wait on."""
+
+    def __init__(self):
+        self.version = 0
+        self.outputs = []
+        self._changed = threading.Condition()
+
+    def publish(self, outputs):
+        with self._changed:
+            self.version += 1
+            self.outputs = list(outputs)
+            self._changed.notify_all()
+
+    def wait(self, version, timeout):
+        """(version, outputs) once newer than version, or None on timeout."""
+
+        with self._changed:
+            if not self._changed.wait_for(
+                lambda: self.version != version, timeout
+            ):
+                return None
+
+            return self.version, self.outputs
+
+
+def make_handler(outputs, reloads):
+    page = PAGE.format(
+        figures="\n".join(
+            FIGURE.format(name=html.escape(name)) for name in outputs
+        )
+    ).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.partition("?")[0].lstrip("/")
+
+            if path == "":
+                self.reply(page, "text/html; charset=utf-8")
+            elif path == "events":
+                self.events()
+            elif path in outputs:
+                try:
+                    with open(path, "rb") as f:
+                        self.reply(f.read(), "image/svg+xml")
+                except OSError:
+                    self.send_error(404)
+            else:
+                self.send_error(404)
+
+        def reply(self, body, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def events(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+
+            version = reloads.version
+
+            try:
+                while True:
+                    change = reloads.wait(version, timeout=15)
+
+                    if change is None:
+                        self.wfile.write(b": keep-alive\n\n")
+                    else:
+                        version, names = change
+                        self.wfile.write(
+                            f"data: {json.dumps(names)}\n\n".encode("utf-8")
+                        )
+
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class Watcher:
+    """Maps changed files to the steps to re-run, and re-runs them."""
+
+    def __init__(self, nodes, run_node, data_files):
+        self.nodes = nodes
+        self.run_node = run_node
+
+        # data file -> steps that read it
+        self.readers = {
+            os.path.abspath(path): [
+                node for node in nodes if producer in node.needs
+            ]
+            for producer, path in data_files
+        }
+
+    def affected(self, changed):
+        """(reload shared modules?, steps to re-run) for changed paths."""
+
+        shared = False
+        steps = []
+
+        for path in changed:
+            name = module_name(path)
+
+            if name in SHARED_MODULES:
+                shared = True
+                steps = list(self.nodes)
+            else:
+                steps.extend(self.readers.get(path, ()))
+                steps.extend(
+                    node for node in self.nodes if node.module == name
+                )
+
+        return shared, [node for node in self.nodes if node in steps]
+
+    def rebuild(self, changed):
+        """Reload and re-render; returns the outputs that were re-run."""
+
+        shared, steps = self.affected(changed)
+
+        if not steps:
+            return []
+
+        modules = {module_name(path) for path in changed}
+        started = time.perf_counter()
+
+        try:
+            if shared:
+                for name in SHARED_MODULES:
+                    importlib.reload(sys.modules[name])
+
+            for node in steps:
+                if shared or node.module in modules:
+                    importlib.reload(importlib.import_module(node.module))
+
+                self.run_node(node)
+        except Exception:
+            traceback.print_exc()
+            return []
+
+        elapsed = (time.perf_counter() - started) * 1000
+        names = ", ".join(node.name for node in steps)
+        print(f"[{time.strftime('%H:%M:%S')}] {names} in {elapsed:.1f} ms")
+
+        return [output for node in steps for output in node.outputs]
+
+
+def watch(nodes, run_node, data_files, port=PREVIEW_PORT):
+    """
+    Serve the outputs of nodes and re-render them on change until
+    interrupted. data_files are (producer step, path) pairs that are
+    watched instead of re-run.
+    """
+
+    outputs = [output for node in nodes for output in node.outputs]
+    reloads = Reloads()
+    watcher = Watcher(nodes, run_node, data_files)
+
+    for node in nodes:
+        try:
+            run_node(node)
+        except Exception:
+            traceback.print_exc()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port), make_handler(outputs, reloads)
+    )
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"Previewing {', '.join(outputs)} at http://127.0.0.1:{port}/")
+    print("Watching scripts/ and " + ", ".join(p for _, p in data_files))
+
+    files = watched_files(path for _, path in data_files)
+    stamps = snapshot(files)
+
+    try:
+        while True:
+            time.sleep(WATCH_INTERVAL)
+
+            current = snapshot(files)
+            changed = {
+                os.path.abspath(path)
+                for path in current.keys() | stamps.keys()
+                if current.get(path) != stamps.get(path)
+            }
+            stamps = current
+
+            if changed:
+                written = watcher.rebuild(changed)
+
+                if written:
+                    reloads.publish(written)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
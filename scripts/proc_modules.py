@@ -3,8 +3,13 @@ proc_modules.py
 generates a static, fake output of my skills and tech stack
 """
 
+import os
 from datetime import date
 
+import svgterm
+from manifest import source_digest, write_if_changed
+from svgterm import COMPACT, Document, Panel, emit, style
+
 SVG_WIDTH  = 1000
 FONT       = "monospace"
 FONT_SIZE  = 13
@@ -67,12 +72,6 @@ STATUS_COLORS = {
     "Unloaded": C_UNLOADED,
 }
 
-def escape(t: str) -> str:
-    return str(t).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-
-def tspan(text, color):
-    return f'<tspan fill="{color}">{escape(text)}</tspan>'
-
 def generate_svg() -> str:
     header_lines = [
         [("shavi@ShavirPC:", C_PROMPT), ("/proc$ cat /proc/modules", C_PATH)],
@@ -103,30 +102,30 @@ def generate_svg() -> str:
     all_lines = header_lines + rows + footer_lines
     height = PAD * 2 + len(all_lines) * LH + 4
 
-    svg = [
-        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{height}">',
-        f'<rect width="100%" height="100%" fill="{BG}"/>',
-        f'<style>text {{ font-family: {FONT}; font-size: {FONT_SIZE}px; dominant-baseline: text-before-edge; letter-spacing: 0.2px; }}</style>',
-    ]
+    svg = Document(SVG_WIDTH, height, BG,
+                   style(FONT, FONT_SIZE, 0.2, pre=False, inline=True))
+    svg.add(Panel(PAD, PAD, LH, all_lines))
+
+    return svg.render()
 
-    y = PAD
-    for line in all_lines:
-        if not line:
-            y += LH
-            continue
-        tspans = "".join(tspan(text, col) for text, col in line)
-        svg.append(f'<text x="{PAD}" y="{y}">{tspans}</text>')
-        y += LH
 
-    svg.append("</svg>")
-    return "\n".join(svg)
+def inputs():
+    """The card is static: only the code and the output mode change it."""
+    return {
+        "code": source_digest(__file__, os.path.dirname(svgterm.__file__)),
+        "compact": COMPACT,
+    }
 
 
 def main():
-    svg = generate_svg()
-    with open("proc_modules.svg", "w", encoding="utf-8") as f:
-        f.write(svg)
-    print("proc_modules.svg generated")
+    if write_if_changed(
+        "proc_modules.svg",
+        inputs(),
+        lambda: emit("proc_modules.svg", generate_svg()),
+    ):
+        print("proc_modules.svg generated")
+    else:
+        print("proc_modules.svg unchanged, skipped")
 
 
 if __name__ == "__main__":
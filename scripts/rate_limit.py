@@ -0,0 +1,385 @@
+"""
+rate_limit.py
+
+Client-side scheduler for GitHub's primary and secondary rate limits.
+
+GitHub reports the primary budget of each resource ("core" for REST,
+"graphql" for GraphQL) in the X-RateLimit-* headers of every response,
+and asks clients to back off with Retry-After when a secondary limit is
+hit. RateLimiter keeps track of both and makes requests wait:
+
+- while a resource's remaining budget is down to the reserve and its
+  reset time has not passed yet,
+- while a Retry-After pause is in effect,
+- while too many requests are already in flight, and
+- while a resource has used its per-minute allowance.
+
+Each resource queues its own requests and releases them in priority
+order (lower first, then first come first served); a request waiting
+for one resource's budget never holds back another resource's. When
+only a concurrency slot is missing, the slot goes to the best waiting
+request across resources, so the GraphQL metadata that feeds the
+pipeline is not starved by a queue of statistics polls.
+
+RateLimitedAdapter wraps another transport adapter, so the limiter sits
+in front of everything the session sends:
+
+    limiter = RateLimiter()
+    session.mount("https://", RateLimitedAdapter(HTTPAdapter(), limiter))
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from requests.adapters import BaseAdapter
+
+import tracing
+
+
+# Requests kept back from each primary budget for other tools sharing
+# the token.
+DEFAULT_RESERVE = 50
+
+# GitHub allows at most 100 concurrent requests per token.
+DEFAULT_MAX_CONCURRENT = 20
+
+# Secondary limits in points per minute. Read requests cost one point.
+DEFAULT_POINTS_PER_MINUTE = {
+    "core": 900,
+    "graphql": 2000,
+}
+
+# How often a rate-limited response is retried after waiting.
+RATE_LIMIT_RETRIES = 3
+
+# Fallback pause when GitHub signals a secondary limit without
+# Retry-After.
+SECONDARY_LIMIT_PAUSE = 60
+
+
+# GraphQL selection for the rateLimit object that record_graphql() reads;
+# every query of the run includes it.
+RATE_LIMIT_FIELDS = """
+  rateLimit {
+    cost
+    limit
+    remaining
+    resetAt
+  }
+"""
+
+def resource_for(url):
+    """Return the rate-limit resource a request URL is charged against."""
+
+    return "graphql" if urlsplit(url).path.endswith("/graphql") else "core"
+
+
+class Budget:
+    """Last known primary budget and usage counters for one resource."""
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.rate_limited = 0
+
+        # GraphQL query cost reported by rateLimit { cost }.
+        self.cost = 0
+
+        # (timestamp) of recent requests for the per-minute window.
+        self.window = deque()
+
+
+class RateLimiter:
+    """Throttles and orders requests according to GitHub's budgets."""
+
+    def __init__(
+        self,
+        reserve=DEFAULT_RESERVE,
+        max_concurrent=DEFAULT_MAX_CONCURRENT,
+        points_per_minute=None,
+    ):
+        self.reserve = reserve
+        self.max_concurrent = max_concurrent
+        self.points_per_minute = dict(
+            points_per_minute or DEFAULT_POINTS_PER_MINUTE
+        )
+
+        self.budgets = {
+            resource: Budget() for resource in self.points_per_minute
+        }
+
+        self._cond = threading.Condition()
+        # resource -> heap of (priority, ticket) waiting for it
+        self._waiting = {}
+        self._tickets = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+
+    def _budget(self, resource):
+        if resource not in self.budgets:
+            self.budgets[resource] = Budget()
+
+        return self.budgets[resource]
+
+    # Scheduling
+
+    def _delay(self, resource, now):
+        """Seconds until resource's budgets let a request start, 0 if now."""
+
+        budget = self._budget(resource)
+        delays = [self._paused_until - now]
+
+        if (
+            budget.remaining is not None
+            and budget.remaining <= self.reserve
+            and budget.reset
+            and budget.reset > now
+        ):
+            delays.append(budget.reset - now + 1)
+
+        per_minute = self.points_per_minute.get(resource)
+
+        while budget.window and budget.window[0] <= now - 60:
+            budget.window.popleft()
+
+        if per_minute and len(budget.window) >= per_minute:
+            delays.append(budget.window[0] + 60 - now)
+
+        return max(max(delays), 0)
+
+    def _wait_time(self, resource, ticket, now):
+        """
+        Seconds until ticket may start, 0 if it may start now, or None if
+        it has to wait for another request to start or finish.
+        """
+
+        if self._waiting[resource][0] != ticket:
+            return None
+
+        delay = self._delay(resource, now)
+
+        if delay > 0:
+            return delay
+
+        if self._in_flight >= self.max_concurrent:
+            return None
+
+        # A free slot goes to the first ticket whose own budget allows it
+        # to start, whichever resource that is.
+        for other, queue in self._waiting.items():
+            if (
+                other != resource
+                and queue
+                and queue[0] < ticket
+                and self._delay(other, now) == 0
+            ):
+                return None
+
+        return 0
+
+    def acquire(self, resource, priority=1):
+        """Block until a request for resource may be sent."""
+
+        with self._cond:
+            # Each resource has its own queue, so a request held back by
+            # one budget never holds up requests for another.
+            queue = self._waiting.setdefault(resource, [])
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(queue, ticket)
+
+            budget = self._budget(resource)
+            started = time.time()
+            trace_started = time.perf_counter()
+
+            try:
+                while True:
+                    delay = self._wait_time(resource, ticket, time.time())
+
+                    if delay == 0:
+                        break
+
+                    self._cond.wait(delay)
+            finally:
+                queue.remove(ticket)
+                heapq.heapify(queue)
+                self._cond.notify_all()
+
+            waited = time.time() - started
+
+            if waited > 0.01:
+                budget.throttled += 1
+                budget.waited += waited
+
+                tracing.record(
+                    "throttle",
+                    trace_started,
+                    time.perf_counter() - trace_started,
+                    "wait",
+                    resource=resource,
+                )
+
+            budget.requests += 1
+            budget.window.append(time.time())
+
+            if budget.remaining is not None:
+                budget.remaining -= 1
+
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    # Feedback from responses
+
+    def update(self, resource, response):
+        """
+        Record the budget reported by a response.
+
+        Returns the number of seconds to wait before retrying if the
+        response was rejected by a rate limit, otherwise None.
+        """
+
+        headers = response.headers
+        resource = headers.get("X-RateLimit-Resource", resource)
+
+        with self._cond:
+            budget = self._budget(resource)
+
+            if headers.get("X-RateLimit-Remaining") is not None:
+                budget.remaining = int(headers["X-RateLimit-Remaining"])
+
+            if headers.get("X-RateLimit-Limit") is not None:
+                budget.limit = int(headers["X-RateLimit-Limit"])
+
+            if headers.get("X-RateLimit-Reset") is not None:
+                budget.reset = float(headers["X-RateLimit-Reset"])
+
+            if response.status_code not in (403, 429):
+                return None
+
+            retry_after = headers.get("Retry-After")
+
+            if retry_after is not None:
+                delay = float(retry_after)
+            elif budget.remaining == 0 and budget.reset:
+                delay = budget.reset - time.time() + 1
+            elif response.status_code == 429:
+                delay = SECONDARY_LIMIT_PAUSE
+            else:
+                # An ordinary 403 (e.g. missing permissions).
+                return None
+
+            budget.rate_limited += 1
+
+            self._paused_until = max(
+                self._paused_until,
+                time.time() + max(delay, 0),
+            )
+            self._cond.notify_all()
+
+            return max(delay, 0)
+
+    def record_graphql(self, rate_limit):
+        """Record a GraphQL rateLimit { cost remaining resetAt } object."""
+
+        with self._cond:
+            budget = self._budget("graphql")
+            budget.cost += rate_limit.get("cost") or 0
+
+            if rate_limit.get("remaining") is not None:
+                budget.remaining = rate_limit["remaining"]
+
+            if rate_limit.get("limit") is not None:
+                budget.limit = rate_limit["limit"]
+
+            if rate_limit.get("resetAt"):
+                budget.reset = datetime.fromisoformat(
+                    rate_limit["resetAt"].replace("Z", "+00:00")
+                ).timestamp()
+
+    # Reporting
+
+    def summary(self):
+        """Return one line per resource describing what the run used."""
+
+        lines = []
+
+        with self._cond:
+            for resource, budget in sorted(self.budgets.items()):
+                if not budget.requests:
+                    continue
+
+                line = (
+                    f"{resource:<8} {budget.requests} requests, "
+                    f"remaining {budget.remaining}/{budget.limit}"
+                )
+
+                if resource == "graphql":
+                    line += f", cost {budget.cost}"
+
+                if budget.throttled:
+                    line += (
+                        f", throttled {budget.throttled}x "
+                        f"({budget.waited:.1f}s)"
+                    )
+
+                if budget.rate_limited:
+                    line += f", rate limited {budget.rate_limited}x"
+
+                lines.append(line)
+
+        return lines
+
+
+class RateLimitedAdapter(BaseAdapter):
+    """Transport adapter that sends through a RateLimiter."""
+
+    def __init__(self, adapter, limiter, priorities=None):
+        super().__init__()
+
+        self.adapter = adapter
+        self.limiter = limiter
+
+        # resource -> priority; lower values are sent first.
+        self.priorities = priorities or {"graphql": 0, "core": 1}
+
+    def send(self, request, **kwargs):
+        resource = resource_for(request.url)
+        priority = self.priorities.get(resource, 1)
+
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.limiter.acquire(resource, priority)
+
+            try:
+                response = self.adapter.send(request, **kwargs)
+            finally:
+                self.limiter.release()
+
+            delay = self.limiter.update(resource, response)
+
+            if delay is None or attempt == RATE_LIMIT_RETRIES:
+                return response
+
+            print(
+                f"  Rate limited ({response.status_code}) on {resource}; "
+                f"waiting {delay:.0f}s..."
+            )
+
+            response.close()
+
+        return response
+
+    def close(self):
+        self.adapter.close()
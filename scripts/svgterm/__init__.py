@@ -0,0 +1,44 @@
+"""
+svgterm
+
+Shared rendering for the terminal-style SVG cards (neofetch.svg,
+cube_scramble.svg, proc_modules.svg).
+
+- fragments: memoized SVG fragments (spans, lines, rects, header, style)
+- layout: Span, Panel, Columns and Document, which arrange lines of
+  spans into a card
+- compact: the size-optimised output mode (SVG_COMPACT=1) and emit(),
+  which applies it to a rendered card
+
+Fragments are cached per process, so rendering many cards, or the same
+card again, mostly re-renders only the spans that depend on data.
+"""
+
+from svgterm.compact import COMPACT, compact, emit
+from svgterm.fragments import (
+    cache_clear,
+    cache_info,
+    escape,
+    line,
+    rect,
+    style,
+    text,
+)
+from svgterm.layout import Columns, Document, Panel, Span
+
+__all__ = [
+    "COMPACT",
+    "Columns",
+    "Document",
+    "Panel",
+    "Span",
+    "cache_clear",
+    "cache_info",
+    "compact",
+    "emit",
+    "escape",
+    "line",
+    "rect",
+    "style",
+    "text",
+]
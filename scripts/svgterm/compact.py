@@ -0,0 +1,261 @@
+"""
+compact.py
+
+Size-optimised output for the cards, enabled with SVG_COMPACT=1.
+
+The cards are fetched from raw.githubusercontent.com on every profile
+view, and most of their bytes are repetition: a fill="#..." on every
+span and sticker, 54 spelled-out sticker rects, indentation. compact()
+rewrites a rendered card without changing how it looks:
+
+- adjacent spans of the same colour are merged, and a line that ends up
+  in one colour loses its spans altogether
+- rects that differ only in position and colour become <use> elements
+  pointing at one shape in <defs>
+- colours used often enough to pay for a rule become CSS classes
+- whitespace between elements and inside the stylesheet is dropped
+
+Text content is never touched, so white-space: pre columns stay
+aligned.
+
+    svg = emit("neofetch.svg", generate_svg(metrics))
+
+emit() compacts when the mode is on and reports the bytes saved.
+"""
+
+import os
+import re
+from collections import Counter
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+
+COMPACT = os.getenv("SVG_COMPACT", "") == "1"
+
+NAMESPACE = "http://www.w3.org/2000/svg"
+
+# class="a" saves five bytes over fill="#rrggbb" and the rule
+# .a{fill:#rrggbb} costs sixteen, so a class pays off from four uses.
+MIN_CLASS_USES = 4
+
+# Elements whose text is rendered; whitespace inside them is content.
+TEXT_ELEMENTS = ("text", "tspan")
+
+
+def _names():
+    """a, b, ..., z, aa, ab, ...: short class and id names."""
+
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    length = 1
+
+    while True:
+        for index in range(len(letters) ** length):
+            name = ""
+
+            for _ in range(length):
+                index, digit = divmod(index, len(letters))
+                name = letters[digit] + name
+
+            yield name
+
+        length += 1
+
+
+def _strip_namespace(root):
+    for element in root.iter():
+        element.tag = element.tag.rpartition("}")[2]
+
+
+def _merge_spans(text):
+    """Merge same-coloured neighbours; hoist a single colour onto text."""
+
+    spans = list(text)
+
+    if not spans or text.text:
+        return
+
+    for span in spans:
+        if (
+            span.tag != "tspan"
+            or set(span.attrib) != {"fill"}
+            or len(span)
+            or span.tail
+        ):
+            return
+
+    previous = None
+
+    for span in spans:
+        if previous is not None and previous.get("fill") == span.get("fill"):
+            previous.text = (previous.text or "") + (span.text or "")
+            text.remove(span)
+        else:
+            previous = span
+
+    if len(text) == 1 and "fill" not in text.attrib:
+        span = text[0]
+        text.set("fill", span.get("fill"))
+        text.text = span.text
+        text.remove(span)
+
+
+def _share_geometry(root, names):
+    """Replace rects repeated up to position and colour with <use>."""
+
+    def shape(rect):
+        return tuple(
+            (name, value)
+            for name, value in rect.attrib.items()
+            if name not in ("x", "y", "fill")
+        )
+
+    rects = [
+        element for element in root
+        if element.tag == "rect" and "x" in element.attrib
+        and "id" not in element.attrib
+    ]
+
+    shared = {}
+
+    for key, count in Counter(map(shape, rects)).items():
+        if count > 1:
+            shared[key] = next(names)
+
+    if not shared:
+        return
+
+    defs = ElementTree.Element("defs")
+
+    for key, name in shared.items():
+        ElementTree.SubElement(defs, "rect", {"id": name, **dict(key)})
+
+    for rect in rects:
+        name = shared.get(shape(rect))
+
+        if name is None:
+            continue
+
+        attributes = {
+            "href": f"#{name}", "x": rect.get("x"), "y": rect.get("y")
+        }
+
+        if "fill" in rect.attrib:
+            attributes["fill"] = rect.get("fill")
+
+        rect.tag = "use"
+        rect.attrib.clear()
+        rect.attrib.update(attributes)
+
+    root.insert(0, defs)
+
+
+def _palette(root, names):
+    """Move often-used fills into CSS classes; return the rules."""
+
+    uses = Counter(
+        element.get("fill")
+        for element in root.iter()
+        if "fill" in element.attrib
+    )
+
+    classes = {
+        color: next(names)
+        for color, count in uses.most_common()
+        if count >= MIN_CLASS_USES
+    }
+
+    for element in root.iter():
+        name = classes.get(element.get("fill"))
+
+        if name is None:
+            continue
+
+        del element.attrib["fill"]
+
+        if "class" in element.attrib:
+            name = f"{element.get('class')} {name}"
+
+        element.set("class", name)
+
+    return "".join(
+        f".{name}{{fill:{color}}}" for color, name in classes.items()
+    )
+
+
+def _minify_css(css):
+    css = re.sub(r"\s*([{};:,])\s*", r"\1", css.strip())
+    return css.replace(";}", "}")
+
+
+def _serialize(element, inside_text=False):
+    inside_text = inside_text or element.tag in TEXT_ELEMENTS
+
+    attributes = "".join(
+        f" {name}={quoteattr(value)}"
+        for name, value in element.attrib.items()
+    )
+
+    parts = []
+
+    if element.text and (inside_text or element.text.strip()):
+        parts.append(escape(element.text))
+
+    for child in element:
+        parts.append(_serialize(child, inside_text))
+
+        if child.tail and (inside_text or child.tail.strip()):
+            parts.append(escape(child.tail))
+
+    if not parts:
+        return f"<{element.tag}{attributes}/>"
+
+    return f"<{element.tag}{attributes}>{''.join(parts)}</{element.tag}>"
+
+
+def compact(svg):
+    """Rewrite a rendered card into its compact, equivalent form."""
+
+    root = ElementTree.fromstring(svg)
+    _strip_namespace(root)
+
+    names = _names()
+
+    for text in root.iter("text"):
+        _merge_spans(text)
+
+    _share_geometry(root, names)
+    rules = _palette(root, names)
+
+    stylesheet = root.find("style")
+
+    if stylesheet is None:
+        stylesheet = ElementTree.Element("style")
+        root.insert(0, stylesheet)
+
+    stylesheet.text = _minify_css(stylesheet.text or "") + rules
+
+    root.attrib = {"xmlns": NAMESPACE, **root.attrib}
+
+    return _serialize(root)
+
+
+def emit(name, svg, enabled=None):
+    """
+    The card as it should be written: compacted when the mode is on,
+    with the saving for name reported.
+    """
+
+    if not (COMPACT if enabled is None else enabled):
+        return svg
+
+    small = compact(svg)
+
+    before = len(svg.encode("utf-8"))
+    after = len(small.encode("utf-8"))
+
+    print(
+        f"{name}: {before:,} -> {after:,} bytes "
+        f"({before - after:,} saved, {1 - after / before:.0%})"
+    )
+
+    return small
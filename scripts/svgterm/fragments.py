@@ -0,0 +1,134 @@
+"""
+fragments.py
+
+Memoized SVG fragments for terminal-style cards.
+
+Every fragment is a pure function of hashable arguments and is cached,
+so a fragment that does not depend on data (a prompt, a label, a row of
+ASCII art, a sticker at a fixed position) is formatted once per process
+and returned from the cache on every later render. Spans are cached on
+their own as well, which lets a line that mixes a static label with a
+data value reuse the label.
+"""
+
+import functools
+
+
+def escape(text):
+    return (
+        str(text)
+        .replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def span(text, color):
+    """One coloured run of text: <tspan fill="...">...</tspan>."""
+
+    return f'<tspan fill="{color}">{escape(text)}</tspan>'
+
+
+@functools.lru_cache(maxsize=None)
+def line(x, y, spans):
+    """
+    A <text> element at (x, y) made of spans, a tuple of (text, color)
+    pairs.
+    """
+
+    content = "".join(span(text, color) for text, color in spans)
+    return f'<text x="{x}" y="{y}">{content}</text>'
+
+
+@functools.lru_cache(maxsize=None)
+def text(x, y, content, color, bold=False):
+    """A single-colour <text> element without spans."""
+
+    weight = ' font-weight="bold"' if bold else ""
+    return (
+        f'<text x="{x}" y="{y}" fill="{color}"{weight}>'
+        f"{escape(content)}</text>"
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def rect(x, y, width, height, fill, radius=0, stroke=None, stroke_width=0):
+    corners = f' rx="{radius}"' if radius else ""
+    outline = (
+        f' stroke="{stroke}" stroke-width="{stroke_width}"' if stroke else ""
+    )
+
+    return (
+        f'<rect x="{x}" y="{y}" width="{width}" height="{height}"'
+        f'{corners} fill="{fill}"{outline}/>'
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def header(width, height, background):
+    """Opening <svg> tag and the full-size background."""
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+        f'height="{height}">\n'
+        f'<rect width="100%" height="100%" fill="{background}"/>'
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def style(font_family, font_size, letter_spacing, pre=True, inline=False):
+    """
+    The <style> block for the card's text.
+
+    pre keeps runs of spaces (white-space: pre), which aligned columns
+    rely on. inline puts the rule on one line.
+    """
+
+    rules = [
+        f"font-family: {font_family};",
+        f"font-size: {font_size}px;",
+    ]
+
+    if pre:
+        rules.append("white-space: pre;")
+
+    rules.append("dominant-baseline: text-before-edge;")
+    rules.append(f"letter-spacing: {letter_spacing}px;")
+
+    if inline:
+        return f"<style>text {{ {' '.join(rules)} }}</style>"
+
+    body = "".join(f"\n                {rule}" for rule in rules)
+
+    return (
+        "\n"
+        "        <style>\n"
+        f"            text {{{body}\n"
+        "            }\n"
+        "        </style>\n"
+        "        "
+    )
+
+
+FOOTER = "</svg>"
+
+_CACHED = (span, line, text, rect, header, style)
+
+
+def cache_info():
+    """Combined (hits, misses) of every fragment cache."""
+
+    hits = misses = 0
+
+    for function in _CACHED:
+        info = function.cache_info()
+        hits += info.hits
+        misses += info.misses
+
+    return hits, misses
+
+
+def cache_clear():
+    for function in _CACHED:
+        function.cache_clear()
@@ -0,0 +1,111 @@
+"""
+layout.py
+
+Layout model for terminal-style cards: spans, lines, panels, documents.
+
+    card = Document(1000, 600, "#262d33", style(...))
+
+    panel = Panel(16, 16, 20)
+    panel.add(("user@host:", GREEN), ("~$ neofetch", BLUE))
+    panel.skip()
+    panel.add(("Uptime", RED), (" : " + age, WHITE))
+
+    card.add(panel)
+    svg = card.render()
+
+A line is a sequence of (text, color) spans; an empty line leaves a
+blank row. Lines are frozen into tuples when added, so rendering them
+goes through the memoized fragments and unchanged lines are cache hits.
+"""
+
+from collections import namedtuple
+
+from svgterm import fragments
+
+
+Span = namedtuple("Span", ["text", "color"])
+
+
+def freeze(spans):
+    """Turn a line given as any iterable of pairs into a hashable tuple."""
+
+    return tuple(Span(text, color) for text, color in spans)
+
+
+class Panel:
+    """Lines stacked from (x, y), one every line_height."""
+
+    def __init__(self, x, y, line_height, lines=()):
+        self.x = x
+        self.y = y
+        self.line_height = line_height
+        self.lines = [freeze(spans) for spans in lines]
+
+    def add(self, *spans):
+        self.lines.append(freeze(spans))
+
+    def skip(self, count=1):
+        self.lines.extend([()] * count)
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def bottom(self):
+        """y of the row after the last line."""
+
+        return self.y + len(self.lines) * self.line_height
+
+    def row(self, index):
+        """The fragment of one row, or None for a blank or missing row."""
+
+        if index >= len(self.lines) or not self.lines[index]:
+            return None
+
+        return fragments.line(
+            self.x, self.y + index * self.line_height, self.lines[index]
+        )
+
+    def fragments(self):
+        return [
+            fragment
+            for fragment in map(self.row, range(len(self.lines)))
+            if fragment is not None
+        ]
+
+
+class Columns:
+    """Panels side by side, emitted row by row."""
+
+    def __init__(self, *panels):
+        self.panels = panels
+
+    def __len__(self):
+        return max(len(panel) for panel in self.panels)
+
+    def fragments(self):
+        return [
+            fragment
+            for index in range(len(self))
+            for panel in self.panels
+            for fragment in [panel.row(index)]
+            if fragment is not None
+        ]
+
+
+class Document:
+    """A complete card: header, style, then fragments and panels."""
+
+    def __init__(self, width, height, background, style):
+        self.parts = [fragments.header(width, height, background), style]
+
+    def add(self, item):
+        """Add a rendered fragment (str) or anything with fragments()."""
+
+        if isinstance(item, str):
+            self.parts.append(item)
+        else:
+            self.parts.extend(item.fragments())
+
+    def render(self):
+        return "\n".join(self.parts + [fragments.FOOTER])
@@ -0,0 +1,340 @@
+"""
+timeseries.py
+
+Columnar weekly contribution series, kept next to metrics.json.
+
+GitHub's contributor statistics report additions, deletions and commits
+per week for every repository. WeeklySeries keeps those figures as a
+week x repository matrix: one sorted index of week timestamps and one
+flat array per metric, repository-major, so each repository's history is
+a contiguous slice. The index has every week from the first active one
+up to the current week, idle weeks included, so a window of n positions
+is always the last n calendar weeks.
+
+    series = WeeklySeries.load("metrics_weekly.bin")
+
+    added, removed = series.rolling_loc(4)      # per-week 4-week sums
+    series.by_language("additions")             # {language: weekly sums}
+    series.busiest_weeks(5)                     # [(week, commits), ...]
+
+Aggregations work a column at a time through map/accumulate over the
+arrays rather than per-cell Python loops, so the renderers can show
+trends without touching the API.
+
+File format (little-endian):
+    b"WKS1", header length (uint32), JSON header with the repository
+    keys and languages, then the zlib-compressed week index followed by
+    the additions, deletions and commits matrices as int64. Weeks without
+    activity are zero and compress to almost nothing.
+"""
+
+import heapq
+import itertools
+import json
+import operator
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+
+MAGIC = b"WKS1"
+
+METRICS = ("additions", "deletions", "commits")
+
+TYPECODE = "q"
+
+# Seconds per week; week timestamps are GitHub's Sunday 00:00 UTC.
+WEEK = 7 * 86400
+
+# Bytes per item of TYPECODE.
+ITEM_SIZE = array(TYPECODE).itemsize
+
+# weekly_totals() default: every repository, whatever its language.
+ALL_LANGUAGES = object()
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values = array(TYPECODE, values)
+        values.byteswap()
+
+    return values
+
+
+def _zeros(count):
+    return array(TYPECODE, bytes(count * ITEM_SIZE))
+
+
+def week_start(seconds):
+    """Start of the statistics week (Sunday, UTC) containing a timestamp."""
+
+    days = int(seconds) // 86400
+
+    # 1970-01-01 was a Thursday, four days after a Sunday.
+    return (days - (days + 4) % 7) * 86400
+
+
+class WeeklySeries:
+    """Weekly additions, deletions and commits for many repositories."""
+
+    def __init__(self, weeks=None, repos=None, languages=None,
+                 additions=None, deletions=None, commits=None):
+        # Sorted week start timestamps (seconds, UTC).
+        self.weeks = weeks if weeks is not None else array(TYPECODE)
+
+        # Repository keys ("login/repo") and their primary languages.
+        self.repos = list(repos or [])
+        self.languages = list(languages or [None] * len(self.repos))
+
+        size = len(self.weeks) * len(self.repos)
+
+        self.additions = additions if additions is not None else _zeros(size)
+        self.deletions = deletions if deletions is not None else _zeros(size)
+        self.commits = commits if commits is not None else _zeros(size)
+
+        self._index = {repo: i for i, repo in enumerate(self.repos)}
+
+    @classmethod
+    def from_repositories(cls, repositories, now=None):
+        """
+        Build a series from {repo: (language, weeks)}.
+
+        weeks is a (week, additions, deletions, commits) tuple of equally
+        long sequences, as parsed from the contributor statistics, and
+        may leave out weeks without activity. The index is filled in
+        with every week up to the one containing now, so trailing idle
+        weeks count in rolling windows.
+        """
+
+        active = set(
+            itertools.chain.from_iterable(
+                weeks[0] for _, weeks in repositories.values()
+            )
+        )
+
+        if active:
+            first = min(active)
+            last = max(
+                max(active), week_start(time.time() if now is None else now)
+            )
+            active.update(range(first, last + 1, WEEK))
+
+        week_index = sorted(active)
+        position = {week: i for i, week in enumerate(week_index)}
+        width = len(week_index)
+
+        repos = sorted(repositories)
+        series = cls(
+            array(TYPECODE, week_index),
+            repos,
+            [repositories[repo][0] for repo in repos],
+        )
+
+        for row, repo in enumerate(repos):
+            _, (weeks, additions, deletions, commits) = repositories[repo]
+            offset = row * width
+
+            for i, week in enumerate(weeks):
+                cell = offset + position[week]
+                series.additions[cell] += additions[i]
+                series.deletions[cell] += deletions[i]
+                series.commits[cell] += commits[i]
+
+        return series
+
+    def __len__(self):
+        return len(self.repos)
+
+    def __contains__(self, repo):
+        return repo in self._index
+
+    def _row(self, values, row):
+        width = len(self.weeks)
+        return values[row * width:(row + 1) * width]
+
+    def repo_weeks(self, repo):
+        """
+        Return (weeks, additions, deletions, commits) for one repository,
+        leaving out weeks without activity, or None if it is unknown.
+        """
+
+        row = self._index.get(repo)
+
+        if row is None:
+            return None
+
+        columns = [
+            self._row(getattr(self, metric), row) for metric in METRICS
+        ]
+        active = [
+            any(values) for values in zip(*columns)
+        ]
+
+        return tuple(
+            array(TYPECODE, itertools.compress(values, active))
+            for values in [self.weeks] + columns
+        )
+
+    # Queries
+
+    def weekly_totals(self, metric="commits", language=ALL_LANGUAGES):
+        """
+        Sum a metric across repositories, one value per week.
+
+        language may name a primary language to restrict the sum to.
+        """
+
+        values = getattr(self, metric)
+        totals = _zeros(len(self.weeks))
+
+        for row, repo_language in enumerate(self.languages):
+            if language is not ALL_LANGUAGES and repo_language != language:
+                continue
+
+            totals = array(
+                TYPECODE, map(operator.add, totals, self._row(values, row))
+            )
+
+        return totals
+
+    def rolling(self, window, metric="commits"):
+        """Trailing window-week sums of a metric, one value per week."""
+
+        cumulative = array(
+            TYPECODE,
+            itertools.accumulate(self.weekly_totals(metric), initial=0),
+        )
+
+        return array(
+            TYPECODE,
+            map(
+                operator.sub,
+                cumulative[1:],
+                _zeros(window)
+                + cumulative[1:max(1, len(cumulative) - window)],
+            ),
+        )
+
+    def rolling_loc(self, window):
+        """Trailing window-week (additions, deletions), one pair per week."""
+
+        return (
+            self.rolling(window, "additions"),
+            self.rolling(window, "deletions"),
+        )
+
+    def recent_loc(self, window):
+        """(additions, deletions) of the last window weeks."""
+
+        added, removed = self.rolling_loc(window)
+
+        if not added:
+            return 0, 0
+
+        return added[-1], removed[-1]
+
+    def by_language(self, metric="additions"):
+        """Return {language: weekly totals} by primary language."""
+
+        return {
+            language: self.weekly_totals(metric, language)
+            for language in sorted(
+                set(self.languages), key=lambda name: name or ""
+            )
+        }
+
+    def busiest_weeks(self, count=5, metric="commits"):
+        """The count weeks with the highest totals, as (week, value)."""
+
+        return heapq.nlargest(
+            count,
+            zip(self.weeks, self.weekly_totals(metric)),
+            key=operator.itemgetter(1),
+        )
+
+    # Storage
+
+    def save(self, path):
+        header = json.dumps(
+            {
+                "repos": self.repos,
+                "languages": self.languages,
+                "weeks": len(self.weeks),
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+        body = zlib.compress(
+            b"".join(
+                _little_endian(values).tobytes()
+                for values in (
+                    self.weeks,
+                    self.additions,
+                    self.deletions,
+                    self.commits,
+                )
+            ),
+            9,
+        )
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        temporary = f"{path}.tmp"
+
+        with open(temporary, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(body)
+
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved series; raises OSError or ValueError."""
+
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if len(data) < 8 or data[:4] != MAGIC:
+            raise ValueError(f"{path} is not a weekly series file")
+
+        (header_size,) = struct.unpack_from("<I", data, 4)
+
+        if 8 + header_size > len(data):
+            raise ValueError(f"{path} is truncated")
+
+        try:
+            header = json.loads(data[8:8 + header_size])
+            width = int(header["weeks"])
+            repos = [str(repo) for repo in header["repos"]]
+            languages = list(header["languages"])
+        except (ValueError, KeyError, TypeError) as exc:
+            raise ValueError(f"{path} has a corrupt header: {exc}") from exc
+
+        if width < 0 or len(languages) != len(repos):
+            raise ValueError(f"{path} has a corrupt header")
+
+        try:
+            body = zlib.decompress(data[8 + header_size:])
+        except zlib.error as exc:
+            raise ValueError(f"{path} is corrupt: {exc}") from exc
+
+        size = width * len(repos)
+
+        if len(body) != (width + 3 * size) * ITEM_SIZE:
+            raise ValueError(f"{path} is truncated")
+
+        columns = []
+        start = 0
+
+        for count in (width, size, size, size):
+            values = array(TYPECODE)
+            values.frombytes(body[start:start + count * ITEM_SIZE])
+            columns.append(_little_endian(values))
+            start += count * ITEM_SIZE
+
+        return cls(columns[0], repos, languages, *columns[1:])
@@ -0,0 +1,240 @@
+"""
+tracing.py
+
+Lightweight span tracing for the metrics run.
+
+    with tracing.span("warm-up", repos=42):
+        ...
+
+    @tracing.traced("graphql")
+    def graphql(...):
+        ...
+
+    tracing.sleep(delay, "backoff")
+
+Tracing is off until enable() is called. While it is off, span() hands
+back one shared no-op context manager and traced functions are called
+directly, so instrumented code pays a single flag check.
+
+Recorded spans can be exported as Chrome trace-event JSON (open it in
+chrome://tracing or https://ui.perfetto.dev) or summarised as text.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+
+_enabled = False
+_lock = threading.Lock()
+_events = []
+_origin = time.perf_counter()
+
+
+def enable():
+    global _enabled, _origin
+
+    with _lock:
+        _events.clear()
+        _origin = time.perf_counter()
+        _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(name, started, duration, category="run", **args):
+    """Record a span that has already finished (perf_counter times)."""
+
+    if not _enabled:
+        return
+
+    event = {
+        "name": name,
+        "cat": category,
+        "ts": (started - _origin) * 1e6,
+        "dur": duration * 1e6,
+        "tid": threading.get_ident(),
+        "thread": threading.current_thread().name,
+        "args": args,
+    }
+
+    with _lock:
+        _events.append(event)
+
+
+class _Span:
+    __slots__ = ("name", "category", "args", "started")
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+
+        record(
+            self.name,
+            self.started,
+            time.perf_counter() - self.started,
+            self.category,
+            **self.args,
+        )
+
+        return False
+
+    def set(self, **args):
+        """Attach more arguments to the span, e.g. a status code."""
+
+        self.args.update(args)
+
+
+class _NoopSpan:
+    """Shared stand-in for _Span while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, category="run", **args):
+    """Context manager timing the enclosed block."""
+
+    if not _enabled:
+        return _NOOP
+
+    return _Span(name, category, args)
+
+
+def traced(name=None, category="run"):
+    """Decorator timing every call of a function."""
+
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            with _Span(span_name, category, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def sleep(seconds, reason="sleep"):
+    """time.sleep that shows up in the trace as a wait."""
+
+    with span(reason, category="sleep", seconds=round(seconds, 3)):
+        time.sleep(seconds)
+
+
+# Export
+
+def export_chrome(path):
+    """Write the recorded spans as Chrome trace-event JSON."""
+
+    with _lock:
+        events = list(_events)
+
+    pid = os.getpid()
+    thread_ids = {}
+    trace = []
+
+    for event in events:
+        if event["tid"] not in thread_ids:
+            thread_ids[event["tid"]] = len(thread_ids) + 1
+
+            # Metadata event naming the thread's row in the viewer.
+            trace.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": thread_ids[event["tid"]],
+                    "args": {"name": event["thread"]},
+                }
+            )
+
+        tid = thread_ids[event["tid"]]
+
+        trace.append(
+            {
+                "name": event["name"],
+                "cat": event["cat"],
+                "ph": "X",
+                "ts": round(event["ts"], 1),
+                "dur": round(event["dur"], 1),
+                "pid": pid,
+                "tid": tid,
+                "args": event["args"],
+            }
+        )
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+def summary_lines(slowest=10):
+    """Totals per span name, then the slowest individual spans."""
+
+    with _lock:
+        events = list(_events)
+
+    totals = {}
+
+    for event in events:
+        count, total, longest = totals.get(event["name"], (0, 0.0, 0.0))
+        totals[event["name"]] = (
+            count + 1,
+            total + event["dur"],
+            max(longest, event["dur"]),
+        )
+
+    lines = [f"{'span':<24} {'count':>6} {'total':>10} {'max':>10}"]
+
+    for name, (count, total, longest) in sorted(
+        totals.items(), key=lambda item: item[1][1], reverse=True
+    ):
+        lines.append(
+            f"{name:<24} {count:>6} {total / 1e6:>9.2f}s "
+            f"{longest / 1e6:>9.2f}s"
+        )
+
+    lines.append("")
+    lines.append("slowest spans:")
+
+    for event in sorted(events, key=lambda e: e["dur"], reverse=True)[:slowest]:
+        args = ", ".join(f"{k}={v}" for k, v in event["args"].items())
+        lines.append(
+            f"  {event['dur'] / 1e6:>8.2f}s  {event['name']:<20} {args}"
+        )
+
+    return lines
@@ -0,0 +1,281 @@
+"""
+transport.py
+
+Tuned HTTP transport for the GitHub API with per-request timing.
+
+TransportAdapter extends the caching adapter with:
+
+- explicit connection-pool sizing and TCP keep-alive on pooled sockets
+- timing of every request, split into phases:
+    connect   DNS lookup + TCP connect of a new pooled connection
+    tls       TLS handshake of a new pooled connection
+    ttfb      request sent until response headers arrived
+    download  response headers until the body was fully read
+    total     ttfb + download
+  grouped by endpoint type (graphql, stats, other)
+
+Timings are kept in a TransportStats recorder, which reports latency
+histograms with p50/p95/max and can be written out as JSON.
+
+DNS and TCP connect happen inside one socket.create_connection call in
+urllib3, so they are reported together.
+"""
+
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from http_cache import CachingAdapter
+
+
+# Upper bounds, in seconds, of the histogram buckets.
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+PHASES = ("connect", "tls", "ttfb", "download", "total")
+
+# Encodings GitHub can compress responses with.
+ACCEPT_ENCODING = "gzip, deflate"
+
+KEEPALIVE_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+
+def endpoint_for(url):
+    path = urlsplit(url).path
+
+    if path.endswith("/graphql"):
+        return "graphql"
+
+    if path.endswith("/stats/contributors"):
+        return "stats"
+
+    return "other"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class TransportStats:
+    """Thread-safe recorder of request phase durations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # (endpoint, phase) -> [seconds]
+        self._samples = {}
+
+        self.connections = 0
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def record(self, endpoint, phase, seconds):
+        with self._lock:
+            self._samples.setdefault((endpoint, phase), []).append(seconds)
+
+    def summary(self):
+        """Return {endpoint: {phase: histogram}}."""
+
+        with self._lock:
+            samples = {key: sorted(values)
+                       for key, values in self._samples.items()}
+
+        summary = {}
+
+        for (endpoint, phase), values in sorted(samples.items()):
+            counts = [0] * len(BUCKETS)
+
+            for value in values:
+                for i, bound in enumerate(BUCKETS):
+                    if value <= bound:
+                        counts[i] += 1
+                        break
+
+            summary.setdefault(endpoint, {})[phase] = {
+                "count": len(values),
+                "p50": round(percentile(values, 0.50), 4),
+                "p95": round(percentile(values, 0.95), 4),
+                "max": round(values[-1], 4),
+                "sum": round(sum(values), 4),
+                "buckets": {
+                    ("+Inf" if bound == float("inf") else f"{bound}"): count
+                    for bound, count in zip(BUCKETS, counts)
+                },
+            }
+
+        return summary
+
+    def lines(self):
+        """Compact text table of the p50/p95/max per endpoint and phase."""
+
+        lines = []
+
+        for endpoint, phases in self.summary().items():
+            for phase in PHASES:
+                if phase not in phases:
+                    continue
+
+                h = phases[phase]
+                lines.append(
+                    f"{endpoint:<8} {phase:<9} n={h['count']:<5} "
+                    f"p50={h['p50'] * 1000:7.1f}ms "
+                    f"p95={h['p95'] * 1000:7.1f}ms "
+                    f"max={h['max'] * 1000:7.1f}ms"
+                )
+
+        return lines
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "connections_opened": self.connections,
+                    "endpoints": self.summary(),
+                },
+                f,
+                indent=2,
+            )
+
+
+def _timed_connection(base, stats):
+    """Subclass a urllib3 connection class to time connect and TLS."""
+
+    class TimedConnection(base):
+        def _new_conn(self):
+            started = time.perf_counter()
+            sock = super()._new_conn()
+            self._tcp_seconds = time.perf_counter() - started
+            return sock
+
+        def connect(self):
+            started = time.perf_counter()
+            self._tcp_seconds = 0.0
+
+            super().connect()
+
+            elapsed = time.perf_counter() - started
+
+            stats.record("connection", "connect", self._tcp_seconds)
+
+            if isinstance(self, HTTPSConnection):
+                stats.record(
+                    "connection",
+                    "tls",
+                    max(elapsed - self._tcp_seconds, 0.0),
+                )
+
+            stats.count_connection()
+
+    TimedConnection.__name__ = f"Timed{base.__name__}"
+    return TimedConnection
+
+
+class _TimedBody:
+    """Proxy for a response body that records when it is fully read."""
+
+    def __init__(self, raw, on_done):
+        self._raw = raw
+        self._on_done = on_done
+
+    def _finish(self):
+        if self._on_done is not None:
+            self._on_done()
+            self._on_done = None
+
+    def read(self, *args, **kwargs):
+        data = self._raw.read(*args, **kwargs)
+
+        if not data:
+            self._finish()
+
+        return data
+
+    def close(self):
+        self._finish()
+        self._raw.close()
+
+    def __getattr__(self, name):
+        attr = getattr(self._raw, name)
+
+        if name != "stream":
+            return attr
+
+        def stream(*args, **kwargs):
+            yield from attr(*args, **kwargs)
+            self._finish()
+
+        return stream
+
+
+class TransportAdapter(CachingAdapter):
+    """Caching adapter with sized pools, keep-alive and request timing."""
+
+    def __init__(self, cache, stats, pool_connections=1, pool_maxsize=10):
+        self.stats = stats
+        self._local = threading.local()
+
+        super().__init__(
+            cache,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=False,
+        )
+
+    def init_poolmanager(self, connections, maxsize, block=False,
+                         **pool_kwargs):
+        pool_kwargs.setdefault("socket_options", KEEPALIVE_OPTIONS)
+
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+
+        http_pool = type(
+            "TimedHTTPConnectionPool",
+            (HTTPConnectionPool,),
+            {"ConnectionCls": _timed_connection(HTTPConnection, self.stats)},
+        )
+        https_pool = type(
+            "TimedHTTPSConnectionPool",
+            (HTTPSConnectionPool,),
+            {"ConnectionCls": _timed_connection(HTTPSConnection, self.stats)},
+        )
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": http_pool,
+            "https": https_pool,
+        }
+
+    def build_response(self, req, resp):
+        # Called as soon as the response headers have been parsed.
+        self._local.headers_at = time.perf_counter()
+        return super().build_response(req, resp)
+
+    def send(self, request, **kwargs):
+        endpoint = endpoint_for(request.url)
+        started = time.perf_counter()
+
+        self._local.headers_at = None
+
+        response = super().send(request, **kwargs)
+
+        headers_at = self._local.headers_at or time.perf_counter()
+        self.stats.record(endpoint, "ttfb", headers_at - started)
+
+        def done():
+            finished = time.perf_counter()
+            self.stats.record(endpoint, "download", finished - headers_at)
+            self.stats.record(endpoint, "total", finished - started)
+
+        response.raw = _TimedBody(response.raw, done)
+
+        return response